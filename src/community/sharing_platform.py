@@ -4,13 +4,23 @@ Enables users to share, discover, and collaborate on flashcard decks
 """
 
 import sqlite3
-import json
 import hashlib
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
-import uuid
+import zlib
+from collections import OrderedDict
+
+import orjson
 
 class DeckVisibility(Enum):
     PUBLIC = "public"
@@ -70,6 +80,189 @@ class UserProfile:
     reputation_score: int
     is_verified: bool = False
 
+# Timestamp columns are declared DATETIME; let the driver parse them into datetimes
+sqlite3.register_converter("DATETIME", lambda raw: datetime.fromisoformat(raw.decode()))
+
+_VIS = {v.value: v for v in DeckVisibility}
+
+# ULIDs are 26 Crockford base32 digits; encode them two digits (10 bits) at a time
+_ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ULID_PAIRS = [a + b for a in _ULID_ALPHABET for b in _ULID_ALPHABET]
+_ULID_SHIFTS = tuple(range(120, -1, -10))
+
+class _UlidGenerator:
+    """Monotonic ULIDs drawing randomness from a buffered urandom pool"""
+    
+    def __init__(self, pool_size: int = 4096):
+        self._pool_size = pool_size
+        self._pool = b""
+        self._offset = 0
+        self._last_ms = -1
+        self._last_random = 0
+        self._lock = threading.Lock()
+    
+    def _random80(self) -> int:
+        if self._offset + 10 > len(self._pool):
+            self._pool = os.urandom(self._pool_size)
+            self._offset = 0
+        chunk = self._pool[self._offset:self._offset + 10]
+        self._offset += 10
+        return int.from_bytes(chunk, "big")
+    
+    def new(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            # IDs minted within the same millisecond count up so they stay sorted
+            if now_ms <= self._last_ms and self._last_random < (1 << 80) - 1:
+                now_ms = self._last_ms
+                self._last_random += 1
+            else:
+                self._last_random = self._random80()
+            self._last_ms = now_ms
+            value = (now_ms << 80) | self._last_random
+        
+        return "".join([_ULID_PAIRS[(value >> shift) & 1023] for shift in _ULID_SHIFTS])
+
+# Time-ordered IDs keep primary key inserts at the right edge of the B-tree
+_new_id = _UlidGenerator().new
+
+def _encode_deck_data(deck_data: Dict[str, Any]) -> bytes:
+    """Serialize deck data to compressed JSON for storage"""
+    return zlib.compress(orjson.dumps(deck_data), 6)
+
+def _inflate_deck_data(raw: Any) -> bytes:
+    """Return the JSON bytes of stored deck data"""
+    # Decks shared before compression was introduced are plain JSON text
+    if isinstance(raw, str):
+        return raw.encode('utf-8')
+    return zlib.decompress(raw)
+
+def _decode_deck_data(raw: Any) -> Dict[str, Any]:
+    """Decode stored deck data"""
+    return orjson.loads(_inflate_deck_data(raw))
+
+# Entries kept by each of CommunityManager's in-memory caches
+_CACHE_SIZE = 128
+
+class _LRUCache:
+    """Small thread-safe LRU map"""
+    
+    def __init__(self, maxsize: int = _CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+# Columns needed to build a SharedDeck; deck_data is deliberately left out so
+# list queries don't haul the compressed card blob through every row
+_DECK_COLUMNS = '''
+    d.deck_id, d.title, d.description, d.author_id, d.author_name, d.subject,
+    d.difficulty, d.card_count, d.visibility, d.tags, d.created_at, d.updated_at,
+    d.download_count, d.rating_average, d.rating_count, d.is_featured, d.language
+'''
+
+def _row_to_deck(row: Tuple) -> SharedDeck:
+    """Build a SharedDeck from a row selected with _DECK_COLUMNS"""
+    return SharedDeck(
+        deck_id=row[0],
+        title=row[1],
+        description=row[2] or "",
+        author_id=row[3],
+        author_name=row[4],
+        subject=row[5],
+        difficulty=row[6],
+        card_count=row[7],
+        visibility=_VIS[row[8]],
+        tags=orjson.loads(row[9]),
+        created_at=row[10],
+        updated_at=row[11],
+        download_count=row[12],
+        rating_average=row[13],
+        rating_count=row[14],
+        is_featured=bool(row[15]),
+        language=row[16]
+    )
+
+# Trending windows: denormalized counter column and the SQLite datetime modifier
+# used when periodically recomputing it from deck_downloads
+_TRENDING_WINDOWS = {
+    "day": ("recent_downloads_day", "-1 day"),
+    "week": ("recent_downloads_week", "-7 days"),
+    "month": ("recent_downloads_month", "-30 days")
+}
+
+# How often the trending counters are recomputed to drop expired downloads
+_TRENDING_REFRESH_SECONDS = 3600
+
+_TRENDING_RECOUNT_SQL = "UPDATE shared_decks SET " + ", ".join(
+    f"""{column} = (SELECT COUNT(*) FROM deck_downloads dl
+        WHERE dl.deck_id = shared_decks.deck_id
+        AND dl.downloaded_at > datetime('now', '{modifier}'))"""
+    for column, modifier in _TRENDING_WINDOWS.values()
+)
+
+def _fts_quote(text: str) -> str:
+    """Quote user input as a single FTS5 string so it can't inject query syntax"""
+    return '"' + text.replace('"', '""') + '"'
+
+_SEARCH_SORTS = {
+    "rating": "d.rating_average DESC, d.rating_count DESC",
+    "downloads": "d.download_count DESC",
+    "newest": "d.created_at DESC",
+    "title": "d.title ASC",
+    "relevance": "bm25(decks_fts)",
+}
+
+@lru_cache(maxsize=256)
+def _search_sql(has_match: bool, has_tags: bool, has_subject: bool, has_difficulty: bool,
+                has_language: bool, sort_by: str) -> str:
+    """Build the search SQL for one filter shape; identical text reuses sqlite3's statement cache"""
+    where_conditions = ["d.visibility = 'public'"]
+    
+    if has_match:
+        where_conditions.append("decks_fts MATCH ?")
+    
+    # Every requested tag must be present; deck_tags is keyed on (tag, deck_id).
+    # Tags arrive as one JSON array so any number of them shares a statement.
+    if has_tags:
+        where_conditions.append('''d.deck_id IN (
+            SELECT deck_id FROM deck_tags WHERE tag IN (SELECT value FROM json_each(?))
+            GROUP BY deck_id HAVING COUNT(*) = ?
+        )''')
+    
+    if has_subject:
+        where_conditions.append("d.subject = ?")
+    
+    if has_difficulty:
+        where_conditions.append("d.difficulty = ?")
+    
+    if has_language:
+        where_conditions.append("d.language = ?")
+    
+    fts_join = "JOIN decks_fts ON decks_fts.rowid = d.rowid" if has_match else ""
+    
+    return f'''
+        SELECT {_DECK_COLUMNS}
+        FROM shared_decks d
+        {fts_join}
+        WHERE {" AND ".join(where_conditions)}
+        ORDER BY {_SEARCH_SORTS[sort_by]}
+        LIMIT ?
+    '''
+
 class CommunityDatabase:
     """Database manager for community features"""
     
@@ -77,11 +270,31 @@ class CommunityDatabase:
         self.db_path = db_path
         self._initialize_database()
     
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a connection tuned for concurrent reads and cheap commits"""
+        if read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        else:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA cache_size=-20000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+    
     def _initialize_database(self):
         """Initialize community database tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # WAL is persistent on the database file, so it only needs setting once
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Users table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -106,6 +319,7 @@ class CommunityDatabase:
                 title TEXT NOT NULL,
                 description TEXT,
                 author_id TEXT NOT NULL,
+                author_name TEXT NOT NULL DEFAULT '',
                 subject TEXT NOT NULL,
                 difficulty TEXT NOT NULL,
                 card_count INTEGER NOT NULL,
@@ -118,11 +332,60 @@ class CommunityDatabase:
                 rating_count INTEGER DEFAULT 0,
                 is_featured BOOLEAN DEFAULT FALSE,
                 language TEXT DEFAULT 'en',
-                deck_data TEXT NOT NULL,
+                deck_data BLOB NOT NULL,
+                recent_downloads_day INTEGER DEFAULT 0,
+                recent_downloads_week INTEGER DEFAULT 0,
+                recent_downloads_month INTEGER DEFAULT 0,
                 FOREIGN KEY (author_id) REFERENCES users (user_id)
             )
         ''')
         
+        # Bring databases created with an older schema up to date
+        cursor.execute('PRAGMA table_info(shared_decks)')
+        deck_columns = {row[1] for row in cursor.fetchall()}
+        missing_trending = [column for column, _ in _TRENDING_WINDOWS.values()
+                            if column not in deck_columns]
+        for column in missing_trending:
+            cursor.execute(f'ALTER TABLE shared_decks ADD COLUMN {column} INTEGER DEFAULT 0')
+        if missing_trending:
+            cursor.execute(_TRENDING_RECOUNT_SQL)
+        
+        if 'author_name' not in deck_columns:
+            cursor.execute("ALTER TABLE shared_decks ADD COLUMN author_name TEXT NOT NULL DEFAULT ''")
+            cursor.execute('''
+                UPDATE shared_decks SET author_name = COALESCE(
+                    (SELECT username FROM users WHERE user_id = shared_decks.author_id), ''
+                )
+            ''')
+        
+        # Keep the denormalized author name in step with username changes
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS users_username_update
+            AFTER UPDATE OF username ON users BEGIN
+                UPDATE shared_decks SET author_name = new.username
+                WHERE author_id = new.user_id;
+            END
+        ''')
+        
+        # Normalized tags, so tag filters are index lookups instead of JSON scans
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deck_tags'")
+        deck_tags_exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS deck_tags (
+                deck_id TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (tag, deck_id),
+                FOREIGN KEY (deck_id) REFERENCES shared_decks (deck_id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        
+        if not deck_tags_exists:
+            cursor.execute('''
+                INSERT OR IGNORE INTO deck_tags (deck_id, tag)
+                SELECT d.deck_id, t.value FROM shared_decks d, json_each(d.tags) t
+            ''')
+        
         
         # Deck ratings table
         cursor.execute('''
@@ -184,7 +447,68 @@ class CommunityDatabase:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_decks_difficulty ON shared_decks (difficulty)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_decks_rating ON shared_decks (rating_average)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_decks_downloads ON shared_decks (download_count)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_deck ON deck_comments (deck_id)')
+        
+        # Composite indexes matching the hot query shapes
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_decks_public_rating
+            ON shared_decks (visibility, rating_average DESC, rating_count DESC)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_decks_public_subject_rating
+            ON shared_decks (visibility, subject, rating_average DESC)
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_decks_author_created ON shared_decks (author_id, created_at DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_deck_time ON deck_downloads (deck_id, downloaded_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ratings_deck ON deck_ratings (deck_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_deck_created ON deck_comments (deck_id, created_at)')
+        for column, _ in _TRENDING_WINDOWS.values():
+            cursor.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_decks_trending_{column}
+                ON shared_decks (visibility, {column} DESC, rating_average DESC)
+            ''')
+        
+        # Superseded by idx_comments_deck_created
+        cursor.execute('DROP INDEX IF EXISTS idx_comments_deck')
+        
+        # Full-text index over deck text. It is an external-content table, so
+        # triggers keep it in sync; tags are indexed from their JSON text, which
+        # the unicode61 tokenizer splits into plain words.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'decks_fts'")
+        fts_exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS decks_fts USING fts5(
+                deck_id UNINDEXED, title, description, tags,
+                content='shared_decks', content_rowid='rowid'
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS decks_fts_insert AFTER INSERT ON shared_decks BEGIN
+                INSERT INTO decks_fts (rowid, deck_id, title, description, tags)
+                VALUES (new.rowid, new.deck_id, new.title, new.description, new.tags);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS decks_fts_delete AFTER DELETE ON shared_decks BEGIN
+                INSERT INTO decks_fts (decks_fts, rowid, deck_id, title, description, tags)
+                VALUES ('delete', old.rowid, old.deck_id, old.title, old.description, old.tags);
+            END
+        ''')
+        # Only text edits touch the index, not counter updates
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS decks_fts_update
+            AFTER UPDATE OF title, description, tags ON shared_decks BEGIN
+                INSERT INTO decks_fts (decks_fts, rowid, deck_id, title, description, tags)
+                VALUES ('delete', old.rowid, old.deck_id, old.title, old.description, old.tags);
+                INSERT INTO decks_fts (rowid, deck_id, title, description, tags)
+                VALUES (new.rowid, new.deck_id, new.title, new.description, new.tags);
+            END
+        ''')
+        
+        if not fts_exists:
+            # Index decks shared before the FTS table existed
+            cursor.execute("INSERT INTO decks_fts (decks_fts) VALUES ('rebuild')")
         
         conn.commit()
         conn.close()
@@ -194,22 +518,86 @@ class CommunityManager:
     
     def __init__(self, db_path: str = "community.db"):
         self.db = CommunityDatabase(db_path)
+        
+        # Single writer connection (SQLite allows one writer at a time) plus
+        # a lazily filled pool of read-only connections
+        self._write_conn = self.db._connect()
+        self._write_lock = threading.Lock()
+        self._read_pool = queue.Queue(maxsize=os.cpu_count() or 4)
+        
+        # Monotonic time of the last trending counter refresh
+        self._trending_refreshed_at = None
+        
+        # Deck data never changes after sharing, so cached payloads never go stale.
+        # Comments are cached with the deck's comment version and dropped from use
+        # as soon as add_comment bumps it (invalidate on write, not write-through).
+        self._deck_cache = _LRUCache()
+        self._comments_cache = _LRUCache()
+        self._comment_versions: Dict[str, int] = {}
+        self._comment_versions_lock = threading.Lock()
+    
+    @contextmanager
+    def _read(self):
+        """Check out a read-only connection from the pool"""
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = self.db._connect(read_only=True)
+        
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    @contextmanager
+    def _write(self):
+        """Run a block as a single IMMEDIATE transaction on the writer connection"""
+        with self._write_lock:
+            cursor = self._write_conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            else:
+                cursor.execute('COMMIT')
+            finally:
+                cursor.close()
+    
+    def _iter_decks(self, sql: str, params) -> Iterator[SharedDeck]:
+        """Yield decks row by row; the read connection is returned once iteration ends"""
+        with self._read() as cursor:
+            for row in cursor.execute(sql, params):
+                yield _row_to_deck(row)
+    
+    def close(self):
+        """Close all pooled database connections"""
+        with self._write_lock:
+            self._write_conn.close()
+        
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
     
     def create_user_profile(self, username: str, email: str, display_name: str, 
                           bio: str = "") -> Optional[UserProfile]:
         """Create a new user profile"""
-        user_id = str(uuid.uuid4())
-        
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
+        user_id = _new_id()
         
         try:
-            cursor.execute('''
-                INSERT INTO users (user_id, username, email, display_name, bio)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, username, email, display_name, bio))
-            
-            conn.commit()
+            with self._write() as cursor:
+                cursor.execute('''
+                    INSERT INTO users (user_id, username, email, display_name, bio)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, username, email, display_name, bio))
             
             return UserProfile(
                 user_id=user_id,
@@ -227,8 +615,6 @@ class CommunityManager:
         except sqlite3.IntegrityError as e:
             print(f"Error creating user profile: {e}")
             return None
-        finally:
-            conn.close()
     
     def share_deck(self, author_id: str, title: str, description: str, 
                   flashcards: List[Dict[str, Any]], subject: str, difficulty: str,
@@ -236,8 +622,21 @@ class CommunityManager:
                   tags: List[str] = None, language: str = "en") -> Optional[str]:
         """Share a flashcard deck with the community"""
         
-        deck_id = str(uuid.uuid4())
-        tags = tags or []
+        try:
+            with self._write() as cursor:
+                return self._insert_deck(cursor, author_id, title, description, flashcards,
+                                         subject, difficulty, visibility, tags or [], language)
+            
+        except Exception as e:
+            print(f"Error sharing deck: {e}")
+            return None
+    
+    def _insert_deck(self, cursor: sqlite3.Cursor, author_id: str, title: str,
+                    description: str, flashcards: List[Dict[str, Any]], subject: str,
+                    difficulty: str, visibility: DeckVisibility, tags: List[str],
+                    language: str) -> str:
+        """Insert a deck and bump the author's deck count inside an open transaction"""
+        deck_id = _new_id()
         
         # Prepare deck data
         deck_data = {
@@ -249,168 +648,134 @@ class CommunityManager:
             }
         }
         
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
+        # The author's username is copied onto the deck so list queries need no JOIN
+        cursor.execute('''
+            INSERT INTO shared_decks 
+            (deck_id, title, description, author_id, author_name, subject, difficulty, 
+             card_count, visibility, tags, language, deck_data)
+            SELECT ?, ?, ?, user_id, username, ?, ?, ?, ?, ?, ?, ?
+            FROM users WHERE user_id = ?
+        ''', (
+            deck_id, title, description, subject, difficulty,
+            len(flashcards), visibility.value, orjson.dumps(tags).decode(), 
+            language, _encode_deck_data(deck_data), author_id
+        ))
         
-        try:
-            cursor.execute('''
-                INSERT INTO shared_decks 
-                (deck_id, title, description, author_id, subject, difficulty, 
-                 card_count, visibility, tags, language, deck_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                deck_id, title, description, author_id, subject, difficulty,
-                len(flashcards), visibility.value, json.dumps(tags), 
-                language, json.dumps(deck_data)
-            ))
-            
-            # Update user's total decks count
-            cursor.execute('''
-                UPDATE users SET total_decks = total_decks + 1 WHERE user_id = ?
-            ''', (author_id,))
-            
-            conn.commit()
-            return deck_id
-            
-        except Exception as e:
-            print(f"Error sharing deck: {e}")
-            return None
-        finally:
-            conn.close()
+        if cursor.rowcount == 0:
+            raise sqlite3.IntegrityError(f"Unknown author: {author_id}")
+        
+        cursor.executemany(
+            'INSERT OR IGNORE INTO deck_tags (deck_id, tag) VALUES (?, ?)',
+            [(deck_id, tag) for tag in tags]
+        )
+        
+        # Update user's total decks count
+        cursor.execute('''
+            UPDATE users SET total_decks = total_decks + 1 WHERE user_id = ?
+        ''', (author_id,))
+        
+        return deck_id
     
     def search_decks(self, query: str = "", subject: str = "", difficulty: str = "",
                     language: str = "", tags: List[str] = None, 
                     sort_by: str = "rating", limit: int = 20) -> List[SharedDeck]:
         """Search for shared decks"""
         
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
-        # Build query
-        where_conditions = ["visibility = 'public'"]
         params = []
         
+        # Free text is answered by the FTS5 index instead of LIKE scans
+        match_terms = []
+        
         if query:
-            where_conditions.append("(title LIKE ? OR description LIKE ?)")
-            params.extend([f"%{query}%", f"%{query}%"])
+            words = " ".join(f"{_fts_quote(word)}*" for word in query.split())
+            if words:
+                match_terms.append(f"{{title description}} : ({words})")
         
-        if subject:
-            where_conditions.append("subject = ?")
-            params.append(subject)
+        if match_terms:
+            params.append(" AND ".join(match_terms))
         
-        if difficulty:
-            where_conditions.append("difficulty = ?")
-            params.append(difficulty)
+        if tags:
+            wanted = list(dict.fromkeys(tags))
+            params.append(orjson.dumps(wanted).decode())
+            params.append(len(wanted))
         
-        if language:
-            where_conditions.append("language = ?")
-            params.append(language)
+        for value in (subject, difficulty, language):
+            if value:
+                params.append(value)
         
-        if tags:
-            for tag in tags:
-                where_conditions.append("tags LIKE ?")
-                params.append(f"%{tag}%")
-        
-        # Sort options
-        sort_options = {
-            "rating": "rating_average DESC, rating_count DESC",
-            "downloads": "download_count DESC",
-            "newest": "created_at DESC",
-            "title": "title ASC"
-        }
-        order_by = sort_options.get(sort_by, "rating_average DESC")
-        
-        query_sql = f'''
-            SELECT d.*, u.username as author_name
-            FROM shared_decks d
-            JOIN users u ON d.author_id = u.user_id
-            WHERE {" AND ".join(where_conditions)}
-            ORDER BY {order_by}
-            LIMIT ?
-        '''
         params.append(limit)
         
+        # Only known sort keys reach the SQL; relevance needs a text query to rank by
+        if sort_by not in _SEARCH_SORTS or (sort_by == "relevance" and not match_terms):
+            sort_by = "rating"
+        
+        query_sql = _search_sql(bool(match_terms), bool(tags), bool(subject),
+                                bool(difficulty), bool(language), sort_by)
+        
         try:
-            cursor.execute(query_sql, params)
-            results = cursor.fetchall()
-            
-            decks = []
-            for row in results:
-                deck = SharedDeck(
-                    deck_id=row[0],
-                    title=row[1],
-                    description=row[2] or "",
-                    author_id=row[3],
-                    author_name=row[-1],  # From JOIN
-                    subject=row[4],
-                    difficulty=row[5],
-                    card_count=row[6],
-                    visibility=DeckVisibility(row[7]),
-                    tags=json.loads(row[8]),
-                    created_at=datetime.fromisoformat(row[9]),
-                    updated_at=datetime.fromisoformat(row[10]),
-                    download_count=row[11],
-                    rating_average=row[12],
-                    rating_count=row[13],
-                    is_featured=bool(row[14]),
-                    language=row[15]
-                )
-                decks.append(deck)
-            
-            return decks
+            return list(self._iter_decks(query_sql, params))
             
         except Exception as e:
             print(f"Error searching decks: {e}")
             return []
-        finally:
-            conn.close()
     
     def download_deck(self, deck_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Download a shared deck"""
         
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Get deck data
-            cursor.execute('''
-                SELECT deck_data, author_id FROM shared_decks WHERE deck_id = ?
-            ''', (deck_id,))
-            
-            result = cursor.fetchone()
-            if not result:
-                return None
-            
-            deck_data, author_id = result
-            
-            # Record download
-            download_id = str(uuid.uuid4())
-            cursor.execute('''
-                INSERT INTO deck_downloads (download_id, deck_id, user_id)
-                VALUES (?, ?, ?)
-            ''', (download_id, deck_id, user_id))
-            
-            # Update download count
-            cursor.execute('''
-                UPDATE shared_decks SET download_count = download_count + 1 
-                WHERE deck_id = ?
-            ''', (deck_id,))
+            # Cached entries are (author_id, deck JSON bytes)
+            entry = self._deck_cache.get(deck_id)
+            raw = None
             
-            # Update author's total downloads
-            cursor.execute('''
-                UPDATE users SET total_downloads = total_downloads + 1 
-                WHERE user_id = ?
-            ''', (author_id,))
+            with self._write() as cursor:
+                if entry is None:
+                    cursor.execute('''
+                        SELECT deck_data, author_id FROM shared_decks WHERE deck_id = ?
+                    ''', (deck_id,))
+                    
+                    result = cursor.fetchone()
+                    if not result:
+                        return None
+                    raw, author_id = result
+                else:
+                    author_id = entry[0]
+                
+                self._count_download(cursor, deck_id, user_id, author_id)
             
-            conn.commit()
+            if entry is None:
+                entry = (author_id, _inflate_deck_data(raw))
+                self._deck_cache.put(deck_id, entry)
             
-            return json.loads(deck_data)
+            # Parse on every call so callers never share a mutable deck dict
+            return orjson.loads(entry[1])
             
         except Exception as e:
             print(f"Error downloading deck: {e}")
             return None
-        finally:
-            conn.close()
+    
+    def _count_download(self, cursor: sqlite3.Cursor, deck_id: str, user_id: str, author_id: str):
+        """Write the download record and counters inside an open transaction"""
+        # Record download
+        download_id = _new_id()
+        cursor.execute('''
+            INSERT INTO deck_downloads (download_id, deck_id, user_id)
+            VALUES (?, ?, ?)
+        ''', (download_id, deck_id, user_id))
+        
+        # Update download count and the trending counters
+        cursor.execute('''
+            UPDATE shared_decks SET download_count = download_count + 1,
+                recent_downloads_day = recent_downloads_day + 1,
+                recent_downloads_week = recent_downloads_week + 1,
+                recent_downloads_month = recent_downloads_month + 1
+            WHERE deck_id = ?
+        ''', (deck_id,))
+        
+        # Update author's total downloads
+        cursor.execute('''
+            UPDATE users SET total_downloads = total_downloads + 1 
+            WHERE user_id = ?
+        ''', (author_id,))
     
     def rate_deck(self, deck_id: str, user_id: str, rating: int, 
                  review_text: str = "") -> bool:
@@ -419,173 +784,172 @@ class CommunityManager:
         if not (1 <= rating <= 5):
             return False
         
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
         try:
-            rating_id = str(uuid.uuid4())
-            
-            # Insert or update rating
-            cursor.execute('''
-                INSERT OR REPLACE INTO deck_ratings 
-                (rating_id, deck_id, user_id, rating, review_text)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (rating_id, deck_id, user_id, rating, review_text))
+            rating_id = _new_id()
             
-            # Recalculate deck rating average
-            cursor.execute('''
-                SELECT AVG(rating), COUNT(rating) FROM deck_ratings WHERE deck_id = ?
-            ''', (deck_id,))
-            
-            avg_rating, rating_count = cursor.fetchone()
-            
-            cursor.execute('''
-                UPDATE shared_decks 
-                SET rating_average = ?, rating_count = ?
-                WHERE deck_id = ?
-            ''', (avg_rating, rating_count, deck_id))
+            with self._write() as cursor:
+                # Previous vote by this user, if any
+                cursor.execute('''
+                    SELECT rating FROM deck_ratings WHERE deck_id = ? AND user_id = ?
+                ''', (deck_id, user_id))
+                previous = cursor.fetchone()
+                
+                # Insert or update rating in place, keeping the original rating_id and created_at
+                cursor.execute('''
+                    INSERT INTO deck_ratings 
+                    (rating_id, deck_id, user_id, rating, review_text)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (deck_id, user_id) DO UPDATE
+                    SET rating = excluded.rating, review_text = excluded.review_text
+                ''', (rating_id, deck_id, user_id, rating, review_text))
+                
+                # Maintain the deck aggregate incrementally instead of rescanning every rating
+                if previous is None:
+                    cursor.execute('''
+                        UPDATE shared_decks 
+                        SET rating_average = (rating_average * rating_count + ?) / (rating_count + 1),
+                            rating_count = rating_count + 1
+                        WHERE deck_id = ?
+                    ''', (rating, deck_id))
+                elif previous[0] != rating:
+                    cursor.execute('''
+                        UPDATE shared_decks 
+                        SET rating_average = rating_average + CAST(? - ? AS REAL) / rating_count
+                        WHERE deck_id = ?
+                    ''', (rating, previous[0], deck_id))
             
-            conn.commit()
             return True
             
         except Exception as e:
             print(f"Error rating deck: {e}")
             return False
-        finally:
-            conn.close()
     
     def add_comment(self, deck_id: str, user_id: str, content: str,
                    parent_comment_id: str = None) -> Optional[str]:
         """Add a comment to a deck"""
         
-        comment_id = str(uuid.uuid4())
-        
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
+        comment_id = _new_id()
         
         try:
-            cursor.execute('''
-                INSERT INTO deck_comments 
-                (comment_id, deck_id, user_id, content, parent_comment_id)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (comment_id, deck_id, user_id, content, parent_comment_id))
+            with self._write() as cursor:
+                cursor.execute('''
+                    INSERT INTO deck_comments 
+                    (comment_id, deck_id, user_id, content, parent_comment_id)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (comment_id, deck_id, user_id, content, parent_comment_id))
+            
+            with self._comment_versions_lock:
+                self._comment_versions[deck_id] = self._comment_versions.get(deck_id, 0) + 1
             
-            conn.commit()
             return comment_id
             
         except Exception as e:
             print(f"Error adding comment: {e}")
             return None
-        finally:
-            conn.close()
     
     def get_deck_comments(self, deck_id: str) -> List[DeckComment]:
         """Get comments for a deck"""
         
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
+        # Read the version before querying so a comment added mid-query marks the result stale
+        with self._comment_versions_lock:
+            version = self._comment_versions.get(deck_id, 0)
+        
+        cached = self._comments_cache.get(deck_id)
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
         
         try:
-            cursor.execute('''
-                SELECT c.*, u.username
-                FROM deck_comments c
-                JOIN users u ON c.user_id = u.user_id
-                WHERE c.deck_id = ?
-                ORDER BY c.created_at ASC
-            ''', (deck_id,))
-            
-            comments = []
-            for row in cursor.fetchall():
-                comment = DeckComment(
-                    comment_id=row[0],
-                    deck_id=row[1],
-                    user_id=row[2],
-                    username=row[-1],  # From JOIN
-                    content=row[3],
-                    created_at=datetime.fromisoformat(row[5]),
-                    parent_comment_id=row[4],
-                    likes=row[6]
-                )
-                comments.append(comment)
+            with self._read() as cursor:
+                cursor.execute('''
+                    SELECT c.*, u.username
+                    FROM deck_comments c
+                    JOIN users u ON c.user_id = u.user_id
+                    WHERE c.deck_id = ?
+                    ORDER BY c.created_at ASC
+                ''', (deck_id,))
+                
+                comments = [
+                    DeckComment(
+                        comment_id=row[0],
+                        deck_id=row[1],
+                        user_id=row[2],
+                        username=row[-1],  # From JOIN
+                        content=row[3],
+                        created_at=row[5],
+                        parent_comment_id=row[4],
+                        likes=row[6]
+                    )
+                    for row in cursor
+                ]
             
-            return comments
+            self._comments_cache.put(deck_id, (version, comments))
+            return list(comments)
             
         except Exception as e:
             print(f"Error getting comments: {e}")
             return []
-        finally:
-            conn.close()
     
     def fork_deck(self, original_deck_id: str, user_id: str, 
                  new_title: str = None, modifications: Dict[str, Any] = None) -> Optional[str]:
         """Fork (copy and customize) an existing deck"""
         
-        # Download original deck
-        original_deck = self.download_deck(original_deck_id, user_id)
-        if not original_deck:
-            return None
-        
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Get original deck info
-            cursor.execute('''
-                SELECT title, description, subject, difficulty, tags, language
-                FROM shared_decks WHERE deck_id = ?
-            ''', (original_deck_id,))
-            
-            original_info = cursor.fetchone()
-            if not original_info:
-                return None
-            
-            # Prepare new deck data
-            flashcards = original_deck['flashcards'].copy()
-            
-            # Apply modifications if provided
-            if modifications:
-                if 'card_modifications' in modifications:
-                    for card_id, changes in modifications['card_modifications'].items():
-                        for card in flashcards:
-                            if card.get('id') == card_id:
-                                card.update(changes)
+            # Download, copy and re-share in a single transaction
+            with self._write() as cursor:
+                # Everything the fork needs comes from one read of the original
+                cursor.execute('''
+                    SELECT deck_data, title, description, subject, difficulty, tags,
+                           language, author_id
+                    FROM shared_decks WHERE deck_id = ?
+                ''', (original_deck_id,))
                 
-                if 'new_cards' in modifications:
-                    flashcards.extend(modifications['new_cards'])
+                original_info = cursor.fetchone()
+                if not original_info:
+                    return None
                 
-                if 'removed_cards' in modifications:
-                    removed_ids = set(modifications['removed_cards'])
-                    flashcards = [card for card in flashcards 
-                                if card.get('id') not in removed_ids]
-            
-            # Create forked deck
-            fork_title = new_title or f"Fork of {original_info[0]}"
-            
-            forked_deck_id = self.share_deck(
-                author_id=user_id,
-                title=fork_title,
-                description=f"Forked from: {original_info[1] or original_info[0]}",
-                flashcards=flashcards,
-                subject=original_info[2],
-                difficulty=original_info[3],
-                tags=json.loads(original_info[4]),
-                language=original_info[5]
-            )
-            
-            return forked_deck_id
+                self._count_download(cursor, original_deck_id, user_id, original_info[7])
+                original_deck = _decode_deck_data(original_info[0])
+                
+                # Prepare new deck data
+                flashcards = original_deck['flashcards']
+                
+                # Apply modifications if provided, in one pass over the cards
+                if modifications:
+                    card_modifications = modifications.get('card_modifications') or {}
+                    removed_ids = set(modifications.get('removed_cards') or ())
+                    
+                    flashcards = [
+                        {**card, **card_modifications[card.get('id')]}
+                        if card.get('id') in card_modifications else card
+                        for card in flashcards
+                        if card.get('id') not in removed_ids
+                    ]
+                    flashcards.extend(card for card in modifications.get('new_cards') or ()
+                                      if card.get('id') not in removed_ids)
+                
+                # Create forked deck
+                fork_title = new_title or f"Fork of {original_info[1]}"
+                
+                return self._insert_deck(
+                    cursor,
+                    author_id=user_id,
+                    title=fork_title,
+                    description=f"Forked from: {original_info[2] or original_info[1]}",
+                    flashcards=flashcards,
+                    subject=original_info[3],
+                    difficulty=original_info[4],
+                    visibility=DeckVisibility.PUBLIC,
+                    tags=orjson.loads(original_info[5]),
+                    language=original_info[6]
+                )
             
         except Exception as e:
             print(f"Error forking deck: {e}")
             return None
-        finally:
-            conn.close()
     
     def get_user_decks(self, user_id: str, include_private: bool = False) -> List[SharedDeck]:
         """Get all decks created by a user"""
         
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
         try:
             where_clause = "author_id = ?"
             params = [user_id]
@@ -593,105 +957,50 @@ class CommunityManager:
             if not include_private:
                 where_clause += " AND visibility != 'private'"
             
-            cursor.execute(f'''
-                SELECT d.*, u.username as author_name
+            return list(self._iter_decks(f'''
+                SELECT {_DECK_COLUMNS}
                 FROM shared_decks d
-                JOIN users u ON d.author_id = u.user_id
                 WHERE {where_clause}
                 ORDER BY d.created_at DESC
-            ''', params)
-            
-            decks = []
-            for row in cursor.fetchall():
-                deck = SharedDeck(
-                    deck_id=row[0],
-                    title=row[1],
-                    description=row[2] or "",
-                    author_id=row[3],
-                    author_name=row[-1],
-                    subject=row[4],
-                    difficulty=row[5],
-                    card_count=row[6],
-                    visibility=DeckVisibility(row[7]),
-                    tags=json.loads(row[8]),
-                    created_at=datetime.fromisoformat(row[9]),
-                    updated_at=datetime.fromisoformat(row[10]),
-                    download_count=row[11],
-                    rating_average=row[12],
-                    rating_count=row[13],
-                    is_featured=bool(row[14]),
-                    language=row[15]
-                )
-                decks.append(deck)
-            
-            return decks
+            ''', params))
             
         except Exception as e:
             print(f"Error getting user decks: {e}")
             return []
-        finally:
-            conn.close()
     
     def get_trending_decks(self, time_period: str = "week", limit: int = 10) -> List[SharedDeck]:
         """Get trending decks based on recent activity"""
         
-        # Calculate date threshold
-        if time_period == "day":
-            threshold = datetime.now() - timedelta(days=1)
-        elif time_period == "week":
-            threshold = datetime.now() - timedelta(weeks=1)
-        elif time_period == "month":
-            threshold = datetime.now() - timedelta(days=30)
-        else:
-            threshold = datetime.now() - timedelta(weeks=1)
-        
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
+        column, _ = _TRENDING_WINDOWS.get(time_period, _TRENDING_WINDOWS["week"])
         
         try:
-            cursor.execute('''
-                SELECT d.*, u.username as author_name,
-                       COUNT(dl.download_id) as recent_downloads
+            self._refresh_trending_counters()
+            
+            return list(self._iter_decks(f'''
+                SELECT {_DECK_COLUMNS}
                 FROM shared_decks d
-                JOIN users u ON d.author_id = u.user_id
-                LEFT JOIN deck_downloads dl ON d.deck_id = dl.deck_id 
-                    AND dl.downloaded_at > ?
                 WHERE d.visibility = 'public'
-                GROUP BY d.deck_id
-                ORDER BY recent_downloads DESC, d.rating_average DESC
+                ORDER BY d.{column} DESC, d.rating_average DESC
                 LIMIT ?
-            ''', (threshold.isoformat(), limit))
-            
-            decks = []
-            for row in cursor.fetchall():
-                deck = SharedDeck(
-                    deck_id=row[0],
-                    title=row[1],
-                    description=row[2] or "",
-                    author_id=row[3],
-                    author_name=row[-2],  # Second to last due to recent_downloads
-                    subject=row[4],
-                    difficulty=row[5],
-                    card_count=row[6],
-                    visibility=DeckVisibility(row[7]),
-                    tags=json.loads(row[8]),
-                    created_at=datetime.fromisoformat(row[9]),
-                    updated_at=datetime.fromisoformat(row[10]),
-                    download_count=row[11],
-                    rating_average=row[12],
-                    rating_count=row[13],
-                    is_featured=bool(row[14]),
-                    language=row[15]
-                )
-                decks.append(deck)
-            
-            return decks
+            ''', (limit,)))
             
         except Exception as e:
             print(f"Error getting trending decks: {e}")
             return []
-        finally:
-            conn.close()
+    
+    def _refresh_trending_counters(self, force: bool = False):
+        """Recompute trending counters from deck_downloads at most once per refresh period"""
+        now = time.monotonic()
+        if (not force and self._trending_refreshed_at is not None
+                and now - self._trending_refreshed_at < _TRENDING_REFRESH_SECONDS):
+            return
+        
+        self._trending_refreshed_at = now
+        
+        # Downloads only expire out of the windows, so decks with no download in
+        # the widest window have nothing to decay
+        with self._write() as cursor:
+            cursor.execute(f"{_TRENDING_RECOUNT_SQL} WHERE recent_downloads_month > 0")
 
 class CommunityModerationSystem:
     """Content moderation and quality control system"""
@@ -701,6 +1010,9 @@ class CommunityModerationSystem:
         self.inappropriate_keywords = [
             'spam', 'scam', 'fake', 'inappropriate', 'offensive'
         ]
+        self._inappropriate_re = re.compile(
+            '|'.join(map(re.escape, self.inappropriate_keywords)), re.IGNORECASE
+        )
     
     def moderate_deck_content(self, title: str, description: str, 
                             flashcards: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -709,30 +1021,39 @@ class CommunityModerationSystem:
         issues = []
         warnings = []
         
+        title_len = len(title.strip())
+        desc_len = len(description.strip())
+        card_count = len(flashcards)
+        
         # Check title and description
-        if len(title.strip()) < 3:
+        if title_len < 3:
             issues.append("Title is too short")
         
-        if any(keyword in title.lower() for keyword in self.inappropriate_keywords):
+        if self._inappropriate_re.search(title):
             issues.append("Title contains inappropriate content")
         
-        if len(description.strip()) < 10:
+        if desc_len < 10:
             warnings.append("Description is very short - consider adding more details")
         
         # Check flashcards quality
-        if len(flashcards) < 5:
+        if card_count < 5:
             warnings.append("Deck has very few cards - consider adding more content")
         
-        empty_cards = sum(1 for card in flashcards 
-                         if not card.get('front', '').strip() or not card.get('back', '').strip())
+        # Count empty and duplicate cards, and gather the content stats used by
+        # the quality score, with comprehensions over the stripped card text
+        fronts = [card.get('front', '').strip() for card in flashcards]
+        backs = [card.get('back', '').strip() for card in flashcards]
+        valid_lengths = [len(front) + len(back) for front, back in zip(fronts, backs)
+                         if front and back]
+        
+        valid_cards = len(valid_lengths)
+        total_content_length = sum(valid_lengths)
+        empty_cards = card_count - valid_cards
+        duplicates = card_count - len({front.lower() for front in fronts})
         
         if empty_cards > 0:
             issues.append(f"{empty_cards} cards have empty content")
         
-        # Check for duplicate cards
-        card_fronts = [card.get('front', '').strip().lower() for card in flashcards]
-        duplicates = len(card_fronts) - len(set(card_fronts))
-        
         if duplicates > 0:
             warnings.append(f"{duplicates} duplicate cards detected")
         
@@ -748,31 +1069,32 @@ class CommunityModerationSystem:
             'status': status,
             'issues': issues,
             'warnings': warnings,
-            'quality_score': self._calculate_quality_score(title, description, flashcards)
+            'quality_score': self._calculate_quality_score(
+                title_len, desc_len, card_count, valid_cards, total_content_length
+            )
         }
     
-    def _calculate_quality_score(self, title: str, description: str, 
-                               flashcards: List[Dict[str, Any]]) -> float:
-        """Calculate quality score for a deck"""
+    def _calculate_quality_score(self, title_len: int, desc_len: int, card_count: int,
+                               valid_cards: int, total_content_length: int) -> float:
+        """Calculate quality score for a deck from its precomputed content stats"""
         score = 0.0
         max_score = 100.0
         
         # Title quality (20 points)
-        if len(title.strip()) >= 10:
+        if title_len >= 10:
             score += 20
-        elif len(title.strip()) >= 5:
+        elif title_len >= 5:
             score += 10
         
         # Description quality (20 points)
-        if len(description.strip()) >= 100:
+        if desc_len >= 100:
             score += 20
-        elif len(description.strip()) >= 50:
+        elif desc_len >= 50:
             score += 15
-        elif len(description.strip()) >= 20:
+        elif desc_len >= 20:
             score += 10
         
         # Card count (20 points)
-        card_count = len(flashcards)
         if card_count >= 20:
             score += 20
         elif card_count >= 10:
@@ -781,20 +1103,9 @@ class CommunityModerationSystem:
             score += 10
         
         # Card content quality (40 points)
-        if flashcards:
-            total_content_length = 0
-            valid_cards = 0
-            
-            for card in flashcards:
-                front = card.get('front', '').strip()
-                back = card.get('back', '').strip()
-                
-                if front and back:
-                    valid_cards += 1
-                    total_content_length += len(front) + len(back)
-            
+        if card_count:
             # Valid card ratio (20 points)
-            valid_ratio = valid_cards / len(flashcards)
+            valid_ratio = valid_cards / card_count
             score += valid_ratio * 20
             
             # Average content length (20 points)
@@ -3,16 +3,74 @@ AI-Powered Interactive Flashcard Editor
 Provides real-time AI suggestions and dynamic editing capabilities
 """
 
-import openai
+import httpx
+from openai import AsyncOpenAI
 import google.generativeai as genai
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+import orjson
+from typing import Dict, List, Any, Mapping, NamedTuple, Optional, Set, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
-import json
+from types import MappingProxyType
+from collections import OrderedDict
+import hashlib
 import re
 import asyncio
+import itertools
+import secrets
+import time
+import uuid
 from datetime import datetime
 
+_CLOZE_RE = re.compile(r'\{\{c1::(.*?)\}\}')
+_CONNECTIVES_RE = re.compile(r'\b(?:however|nevertheless|furthermore|consequently)\b', re.IGNORECASE)
+_LIST_MARKERS = ('•', '-', '1.', '2.')
+
+# Suggestion texts kept per editor, keyed by suggestion type and normalized input
+_SUGGESTION_CACHE_SIZE = 10_000
+
+# Client-side throttling per provider; tune to the account's rate limit tier
+_MAX_CONCURRENT_REQUESTS = 256
+_REQUESTS_PER_MINUTE = 9000
+_OPENAI_MAX_RETRIES = 5
+
+# Connections opened ahead of the first suggestion
+_PREWARM_CONNECTIONS = 8
+
+# Edit sessions idle longer than this, or beyond the cap, are discarded
+_SESSION_TTL_SECONDS = 3600
+_MAX_ACTIVE_SESSIONS = 10_000
+
+class _TextTraits(NamedTuple):
+    """Text statistics gathered once and shared by the suggestion heuristics"""
+    length: int
+    word_count: int
+    long_words: int
+    commas: int
+    periods: int
+    has_newline: bool
+    has_colon: bool
+    has_list_markers: bool
+    has_connective: bool
+    
+    @property
+    def is_complex(self) -> bool:
+        complex_indicators = [
+            self.word_count > 20,  # Long sentences
+            self.long_words > 3,  # Many long words
+            self.commas > 3,  # Many clauses
+            self.has_connective
+        ]
+        return sum(complex_indicators) >= 2
+    
+    @property
+    def needs_formatting(self) -> bool:
+        formatting_indicators = [
+            self.length > 100 and not self.has_newline,  # Long text without breaks
+            self.periods > 2 and not self.has_list_markers,  # Multiple points without bullets
+            self.has_colon and not self.has_newline  # Lists without proper formatting
+        ]
+        return any(formatting_indicators)
+
 class SuggestionType(Enum):
     CLOZE_CONVERSION = "cloze_conversion"
     SIMPLIFICATION = "simplification"
@@ -21,48 +79,38 @@ class SuggestionType(Enum):
     CONTENT_ENHANCEMENT = "content_enhancement"
     GRAMMAR_CORRECTION = "grammar_correction"
 
-@dataclass
-class AISuggestion:
-    type: SuggestionType
-    original_text: str
-    suggested_text: str
-    confidence: float
-    reasoning: str
-    preview: str
+# Confidence and default reasoning per generated suggestion type
+_SUGGESTION_DEFAULTS = {
+    SuggestionType.CLOZE_CONVERSION: (0.8, "Convert to cloze deletion for active recall"),
+    SuggestionType.SIMPLIFICATION: (0.7, "Simplify complex language for better understanding"),
+    SuggestionType.FORMAT_IMPROVEMENT: (0.6, "Improve formatting for better readability"),
+}
 
-@dataclass
-class EditSession:
-    session_id: str
-    user_id: str
-    card_id: str
-    original_content: Dict[str, str]
-    current_content: Dict[str, str]
-    suggestions: List[AISuggestion]
-    accepted_suggestions: List[str]
-    rejected_suggestions: List[str]
-    timestamp: datetime
+# JSON field and instruction per suggestion type for the combined prompt
+_COMBINED_TASKS = {
+    SuggestionType.CLOZE_CONVERSION: (
+        "cloze", "convert the text to cloze deletion by replacing the most important term with {{c1::term}}"
+    ),
+    SuggestionType.SIMPLIFICATION: (
+        "simplification", "simplify the text without jargon while keeping it accurate"
+    ),
+    SuggestionType.FORMAT_IMPROVEMENT: (
+        "format_improvement", "restructure the text for learning, e.g. with bullet points or clear sections"
+    ),
+}
 
-class AIFlashcardEditor:
-    """Advanced AI-powered flashcard editor with real-time suggestions"""
-    
-    def __init__(self, openai_api_key: str, gemini_api_key: str):
-        openai.api_key = openai_api_key
-        genai.configure(api_key=gemini_api_key)
-        self.gemini_model = genai.GenerativeModel('gemini-pro')
-        self.active_sessions = {}
-        
-        # Suggestion templates
-        self.suggestion_prompts = {
-            SuggestionType.CLOZE_CONVERSION: """
+# Suggestion templates, built once per process as closures so each call skips str.format parsing
+SUGGESTION_PROMPTS = MappingProxyType({
+    SuggestionType.CLOZE_CONVERSION: lambda text: f"""
             Convert this flashcard question into a cloze deletion format. 
-            Identify the most important term or concept and replace it with {{c1::term}}.
+            Identify the most important term or concept and replace it with {{{{c1::term}}}}.
             
             Original: {text}
             
             Provide the cloze version and explain why this term was chosen.
             """,
-            
-            SuggestionType.SIMPLIFICATION: """
+    
+    SuggestionType.SIMPLIFICATION: lambda text: f"""
             Simplify this flashcard content to make it more accessible while maintaining accuracy.
             Remove jargon, use simpler words, and make the explanation clearer.
             
@@ -70,8 +118,8 @@ class AIFlashcardEditor:
             
             Provide simplified version and explain the changes made.
             """,
-            
-            SuggestionType.DIFFICULTY_ADJUSTMENT: """
+    
+    SuggestionType.DIFFICULTY_ADJUSTMENT: lambda text, target_level, context: f"""
             Adjust the difficulty of this flashcard to {target_level} level.
             {target_level} level should be appropriate for {context}.
             
@@ -79,8 +127,8 @@ class AIFlashcardEditor:
             
             Provide adjusted version and explain the difficulty changes.
             """,
-            
-            SuggestionType.FORMAT_IMPROVEMENT: """
+    
+    SuggestionType.FORMAT_IMPROVEMENT: lambda text: f"""
             Improve the formatting and structure of this flashcard for better learning.
             Consider using bullet points, clear sections, or better organization.
             
@@ -88,8 +136,8 @@ class AIFlashcardEditor:
             
             Provide improved format and explain the structural changes.
             """,
-            
-            SuggestionType.CONTENT_ENHANCEMENT: """
+    
+    SuggestionType.CONTENT_ENHANCEMENT: lambda text: f"""
             Enhance this flashcard by adding relevant context, examples, or mnemonics.
             Make it more memorable and comprehensive without making it too long.
             
@@ -97,21 +145,187 @@ class AIFlashcardEditor:
             
             Provide enhanced version and explain the additions.
             """
-        }
+})
+
+@dataclass(slots=True)
+class AISuggestion:
+    type: SuggestionType
+    original_text: str
+    suggested_text: str
+    confidence: float
+    reasoning: str
+    preview: str
+    suggestion_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+@dataclass(slots=True)
+class EditSession:
+    session_id: str
+    user_id: str
+    card_id: str
+    original_content: Mapping[str, str]
+    current_content: Dict[str, str]
+    suggestions: Dict[str, AISuggestion]
+    accepted_suggestions: Set[str]
+    rejected_suggestions: Set[str]
+    timestamp: datetime
+    # Fields whose current value differs from the original, and undecided suggestions
+    _dirty_fields: Set[str] = field(default_factory=set)
+    _pending: Dict[str, AISuggestion] = field(default_factory=dict)
+    # In-flight suggestion work, cancelled when a newer keystroke arrives within the delay
+    _pending_task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _debounce_delay: float = 0.4
+    
+    def set_field(self, name: str, value: str):
+        """Update a field of the current content and track whether it differs from the original"""
+        self.current_content[name] = value
+        if value != self.original_content.get(name, ''):
+            self._dirty_fields.add(name)
+        else:
+            self._dirty_fields.discard(name)
+
+class _RateLimiter:
+    """Async token bucket allowing max_rate acquisitions per time_period seconds"""
+    
+    def __init__(self, max_rate: float, time_period: float = 60.0):
+        self.max_rate = max_rate
+        self._refill_rate = max_rate / time_period
+        self._tokens = float(max_rate)
+        self._updated = time.monotonic()
+    
+    async def __aenter__(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.max_rate, self._tokens + (now - self._updated) * self._refill_rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return self
+            await asyncio.sleep((1 - self._tokens) / self._refill_rate)
+    
+    async def __aexit__(self, *exc_info):
+        return False
+
+class _SessionStore:
+    """Edit sessions ordered by last use, expiring after an idle TTL and capped in size"""
+    
+    def __init__(self, maxsize: int = _MAX_ACTIVE_SESSIONS, ttl: float = _SESSION_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> (last_used, EditSession)
+    
+    def _evict(self, now: float):
+        """Drop expired sessions and any over the size cap, oldest first"""
+        while self._sessions:
+            session_id, (last_used, session) = next(iter(self._sessions.items()))
+            if now - last_used < self.ttl and len(self._sessions) <= self.maxsize:
+                break
+            self._sessions.popitem(last=False)
+            self._cancel_pending(session)
+            print(f"Evicted edit session {session_id}")
+    
+    @staticmethod
+    def _cancel_pending(session: EditSession):
+        """Stop debounced suggestion work so it can't call the LLM for a dropped session"""
+        if session._pending_task and not session._pending_task.done():
+            session._pending_task.cancel()
+    
+    def __contains__(self, session_id: str) -> bool:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return False
+        if time.monotonic() - entry[0] >= self.ttl:
+            self._evict(time.monotonic())
+            return session_id in self._sessions
+        return True
+    
+    def __getitem__(self, session_id: str) -> EditSession:
+        now = time.monotonic()
+        _, session = self._sessions[session_id]
+        self._sessions[session_id] = (now, session)
+        self._sessions.move_to_end(session_id)
+        return session
+    
+    def __setitem__(self, session_id: str, session: EditSession):
+        now = time.monotonic()
+        self._sessions[session_id] = (now, session)
+        self._sessions.move_to_end(session_id)
+        self._evict(now)
+    
+    def __delitem__(self, session_id: str):
+        _, session = self._sessions.pop(session_id)
+        self._cancel_pending(session)
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class AIFlashcardEditor:
+    """Advanced AI-powered flashcard editor with real-time suggestions"""
+    
+    _PROMPTS = SUGGESTION_PROMPTS
+    
+    def __init__(self, openai_api_key: str, gemini_api_key: str):
+        # One long-lived HTTP client so OpenAI calls reuse pooled keep-alive connections
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=2000, max_keepalive_connections=1500),
+            timeout=120.0
+        )
+        # The SDK retries 429s and transient errors itself with exponential backoff
+        self._openai = AsyncOpenAI(api_key=openai_api_key, http_client=self._http,
+                                   max_retries=_OPENAI_MAX_RETRIES)
+        
+        # Stay under provider rate limits instead of provoking 429s
+        self._openai_sem = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+        self._openai_rate = _RateLimiter(_REQUESTS_PER_MINUTE)
+        self._gemini_sem = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+        self._gemini_rate = _RateLimiter(_REQUESTS_PER_MINUTE)
+        genai.configure(api_key=gemini_api_key)
+        self.gemini_model = genai.GenerativeModel('gemini-pro')
+        self.active_sessions = _SessionStore()
+        self._suggestion_cache = OrderedDict()
+        self._session_counter = itertools.count()
+        
+        # Open connections in the background when constructed inside a running event loop;
+        # otherwise callers can await prewarm() themselves once their loop is up
+        try:
+            self._prewarm_task = asyncio.get_running_loop().create_task(self.prewarm())
+        except RuntimeError:
+            self._prewarm_task = None
+    
+    async def prewarm(self, connections: int = _PREWARM_CONNECTIONS):
+        """Open keep-alive connections to OpenAI and Gemini before real traffic arrives"""
+        # Warm-up calls go through the same limiters as real traffic, so startup can't burst into 429s
+        async def warm_openai():
+            async with self._openai_rate, self._openai_sem:
+                await self._openai.models.list()
+        
+        async def warm_gemini():
+            async with self._gemini_rate, self._gemini_sem:
+                await self.gemini_model.count_tokens_async("warm up")
+        
+        # Cheap metadata calls: listing models and counting tokens cost nothing
+        warmups = [warm_openai() for _ in range(connections)]
+        warmups.append(warm_gemini())
+        
+        results = await asyncio.gather(*warmups, return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            print(f"Connection prewarm failed for {len(failures)} of {len(results)} calls: {failures[0]}")
     
     def start_edit_session(self, user_id: str, card_content: Dict[str, str]) -> str:
         """Start a new editing session"""
-        session_id = f"edit_{user_id}_{datetime.now().timestamp()}"
+        # Counter plus random suffix: unique within this editor and unguessable across restarts
+        session_id = f"edit_{user_id}_{next(self._session_counter)}_{secrets.token_hex(4)}"
         
         session = EditSession(
             session_id=session_id,
             user_id=user_id,
             card_id=card_content.get('id', ''),
-            original_content=card_content.copy(),
-            current_content=card_content.copy(),
-            suggestions=[],
-            accepted_suggestions=[],
-            rejected_suggestions=[],
+            # The original is only ever read, so freeze it behind a read-only view
+            original_content=MappingProxyType(dict(card_content)),
+            current_content=dict(card_content),
+            suggestions={},
+            accepted_suggestions=set(),
+            rejected_suggestions=set(),
             timestamp=datetime.now()
         )
         
@@ -126,53 +340,82 @@ class AIFlashcardEditor:
             return []
         
         session = self.active_sessions[session_id]
-        session.current_content[field_changed] = new_value
+        session.set_field(field_changed, new_value)
         
-        suggestions = []
+        # Debounce: a newer keystroke supersedes work that hasn't finished yet
+        if session._pending_task and not session._pending_task.done():
+            session._pending_task.cancel()
         
-        # Generate different types of suggestions
+        task = asyncio.create_task(self._debounced_suggestions(session, field_changed, new_value))
+        session._pending_task = task
+        
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Superseded by a newer call; only propagate if our caller was cancelled
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                return []
+            raise
+    
+    async def _debounced_suggestions(self, session: EditSession, field_changed: str,
+                                     new_value: str) -> List[AISuggestion]:
+        """Wait for typing to pause, then generate suggestions for the latest value"""
+        await asyncio.sleep(session._debounce_delay)
+        
+        # Decide which types of suggestions to generate
+        needs = []
         if len(new_value) > 20:  # Only suggest for substantial content
+            traits = self._classify_text(new_value)
+            
             # Cloze conversion suggestion
             if field_changed == 'front' and not '{{c1::' in new_value:
-                cloze_suggestion = await self._generate_cloze_suggestion(new_value)
-                if cloze_suggestion:
-                    suggestions.append(cloze_suggestion)
+                needs.append(SuggestionType.CLOZE_CONVERSION)
             
             # Simplification suggestion
-            if self._is_complex_text(new_value):
-                simplification = await self._generate_simplification_suggestion(new_value)
-                if simplification:
-                    suggestions.append(simplification)
+            if traits.is_complex:
+                needs.append(SuggestionType.SIMPLIFICATION)
             
             # Format improvement suggestion
-            if self._needs_formatting(new_value):
-                format_suggestion = await self._generate_format_suggestion(new_value)
-                if format_suggestion:
-                    suggestions.append(format_suggestion)
+            if traits.needs_formatting:
+                needs.append(SuggestionType.FORMAT_IMPROVEMENT)
         
-        session.suggestions.extend(suggestions)
+        if len(needs) > 1:
+            # One structured request instead of a round trip per type
+            suggestions = await self._generate_combined_suggestions(new_value, needs)
+        elif needs:
+            generators = {
+                SuggestionType.CLOZE_CONVERSION: self._generate_cloze_suggestion,
+                SuggestionType.SIMPLIFICATION: self._generate_simplification_suggestion,
+                SuggestionType.FORMAT_IMPROVEMENT: self._generate_format_suggestion,
+            }
+            suggestion = await generators[needs[0]](new_value)
+            suggestions = [suggestion] if suggestion else []
+        else:
+            suggestions = []
+        
+        session.suggestions.update((s.suggestion_id, s) for s in suggestions)
+        session._pending.update((s.suggestion_id, s) for s in suggestions)
         return suggestions
     
     async def _generate_cloze_suggestion(self, text: str) -> Optional[AISuggestion]:
         """Generate cloze deletion suggestion"""
         try:
-            prompt = self.suggestion_prompts[SuggestionType.CLOZE_CONVERSION].format(text=text)
+            cache_key = self._suggestion_cache_key(SuggestionType.CLOZE_CONVERSION, text)
+            suggested_text = self._cached_suggestion(cache_key)
             
-            response = await self._call_openai_async(prompt)
-            
-            # Parse response to extract cloze version
-            cloze_match = re.search(r'\{\{c1::(.*?)\}\}', response)
-            if cloze_match:
-                suggested_text = response.split('\n')[0]  # First line usually contains the suggestion
+            if suggested_text is None:
+                prompt = self._PROMPTS[SuggestionType.CLOZE_CONVERSION](text)
                 
-                return AISuggestion(
-                    type=SuggestionType.CLOZE_CONVERSION,
-                    original_text=text,
-                    suggested_text=suggested_text,
-                    confidence=0.8,
-                    reasoning="Convert to cloze deletion for active recall",
-                    preview=suggested_text[:100] + "..." if len(suggested_text) > 100 else suggested_text
-                )
+                # First line usually contains the suggestion, so stop generating there
+                first_line = await self._call_openai_first_line(prompt)
+                
+                # Parse response to extract cloze version
+                if _CLOZE_RE.search(first_line):
+                    suggested_text = first_line
+                    self._cache_suggestion(cache_key, suggested_text)
+            
+            if suggested_text is not None:
+                return self._make_suggestion(SuggestionType.CLOZE_CONVERSION, text, suggested_text)
         except Exception as e:
             print(f"Error generating cloze suggestion: {e}")
         
@@ -181,20 +424,19 @@ class AIFlashcardEditor:
     async def _generate_simplification_suggestion(self, text: str) -> Optional[AISuggestion]:
         """Generate text simplification suggestion"""
         try:
-            prompt = self.suggestion_prompts[SuggestionType.SIMPLIFICATION].format(text=text)
+            cache_key = self._suggestion_cache_key(SuggestionType.SIMPLIFICATION, text)
+            suggested_text = self._cached_suggestion(cache_key)
             
-            # Use Gemini for simplification
-            response = self.gemini_model.generate_content(prompt)
-            suggested_text = response.text.split('\n')[0]
+            if suggested_text is None:
+                prompt = self._PROMPTS[SuggestionType.SIMPLIFICATION](text)
+                
+                # Use Gemini for simplification
+                async with self._gemini_rate, self._gemini_sem:
+                    response = await self.gemini_model.generate_content_async(prompt)
+                suggested_text = response.text.split('\n')[0]
+                self._cache_suggestion(cache_key, suggested_text)
             
-            return AISuggestion(
-                type=SuggestionType.SIMPLIFICATION,
-                original_text=text,
-                suggested_text=suggested_text,
-                confidence=0.7,
-                reasoning="Simplify complex language for better understanding",
-                preview=suggested_text[:100] + "..." if len(suggested_text) > 100 else suggested_text
-            )
+            return self._make_suggestion(SuggestionType.SIMPLIFICATION, text, suggested_text)
         except Exception as e:
             print(f"Error generating simplification suggestion: {e}")
         
@@ -203,60 +445,186 @@ class AIFlashcardEditor:
     async def _generate_format_suggestion(self, text: str) -> Optional[AISuggestion]:
         """Generate formatting improvement suggestion"""
         try:
-            prompt = self.suggestion_prompts[SuggestionType.FORMAT_IMPROVEMENT].format(text=text)
+            cache_key = self._suggestion_cache_key(SuggestionType.FORMAT_IMPROVEMENT, text)
+            suggested_text = self._cached_suggestion(cache_key)
             
-            response = await self._call_openai_async(prompt)
-            suggested_text = response.split('\n')[0]
+            if suggested_text is None:
+                prompt = self._PROMPTS[SuggestionType.FORMAT_IMPROVEMENT](text)
+                
+                suggested_text = await self._call_openai_first_line(prompt)
+                self._cache_suggestion(cache_key, suggested_text)
             
-            return AISuggestion(
-                type=SuggestionType.FORMAT_IMPROVEMENT,
-                original_text=text,
-                suggested_text=suggested_text,
-                confidence=0.6,
-                reasoning="Improve formatting for better readability",
-                preview=suggested_text[:100] + "..." if len(suggested_text) > 100 else suggested_text
-            )
+            return self._make_suggestion(SuggestionType.FORMAT_IMPROVEMENT, text, suggested_text)
         except Exception as e:
             print(f"Error generating format suggestion: {e}")
         
         return None
     
+    async def _generate_combined_suggestions(self, text: str,
+                                             needs: List[SuggestionType]) -> List[AISuggestion]:
+        """Generate several suggestion types for the same text with one JSON-mode request"""
+        suggestions = []
+        uncached = []
+        
+        for suggestion_type in needs:
+            cached = self._cached_suggestion(self._suggestion_cache_key(suggestion_type, text))
+            if cached is not None:
+                suggestions.append(self._make_suggestion(suggestion_type, text, cached))
+            else:
+                uncached.append(suggestion_type)
+        
+        if not uncached:
+            return suggestions
+        
+        tasks = "\n".join(
+            f'- "{_COMBINED_TASKS[t][0]}": {_COMBINED_TASKS[t][1]}' for t in uncached
+        )
+        prompt = f"""
+            Improve this flashcard text. Return a JSON object with the fields below, each an
+            object with "text" (the rewritten flashcard text) and "reasoning" (one sentence).
+            {tasks}
+            
+            Original: {text}
+            """
+        
+        try:
+            async with self._openai_rate, self._openai_sem:
+                response = await self._openai.chat.completions.create(
+                    model="gpt-4-turbo",
+                    messages=[
+                        {"role": "system", "content": "You are an expert educational content editor."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=600,
+                    response_format={"type": "json_object"}
+                )
+            result = orjson.loads(response.choices[0].message.content or "{}")
+        except Exception as e:
+            print(f"Error generating combined suggestions: {e}")
+            return suggestions
+        
+        for suggestion_type in uncached:
+            entry = result.get(_COMBINED_TASKS[suggestion_type][0])
+            if not isinstance(entry, dict):
+                continue
+            
+            suggested_text = str(entry.get('text') or "").strip()
+            if not suggested_text:
+                continue
+            if suggestion_type == SuggestionType.CLOZE_CONVERSION and not _CLOZE_RE.search(suggested_text):
+                continue
+            
+            self._cache_suggestion(self._suggestion_cache_key(suggestion_type, text), suggested_text)
+            suggestions.append(self._make_suggestion(
+                suggestion_type, text, suggested_text, entry.get('reasoning') or None
+            ))
+        
+        return suggestions
+    
+    def _make_suggestion(self, suggestion_type: SuggestionType, text: str, suggested_text: str,
+                         reasoning: Optional[str] = None) -> AISuggestion:
+        """Build a suggestion with the type's confidence and default reasoning"""
+        confidence, default_reasoning = _SUGGESTION_DEFAULTS[suggestion_type]
+        return AISuggestion(
+            type=suggestion_type,
+            original_text=text,
+            suggested_text=suggested_text,
+            confidence=confidence,
+            reasoning=reasoning or default_reasoning,
+            preview=suggested_text[:100] + "..." if len(suggested_text) > 100 else suggested_text
+        )
+    
+    def _suggestion_cache_key(self, suggestion_type: SuggestionType, text: str) -> Tuple[SuggestionType, bytes]:
+        """Key repeated inputs by type and a digest of the normalized text"""
+        return suggestion_type, hashlib.blake2b(text.strip().lower().encode('utf-8'), digest_size=16).digest()
+    
+    def _cached_suggestion(self, key: Tuple[SuggestionType, bytes]) -> Optional[str]:
+        """Look up a previously generated suggestion text"""
+        suggested_text = self._suggestion_cache.get(key)
+        if suggested_text is not None:
+            self._suggestion_cache.move_to_end(key)
+        return suggested_text
+    
+    def _cache_suggestion(self, key: Tuple[SuggestionType, bytes], suggested_text: str):
+        """Remember a generated suggestion text, evicting the least recently used"""
+        # Failed calls come back empty; don't pin those
+        if not suggested_text:
+            return
+        self._suggestion_cache[key] = suggested_text
+        if len(self._suggestion_cache) > _SUGGESTION_CACHE_SIZE:
+            self._suggestion_cache.popitem(last=False)
+    
+    def _chat_params(self, prompt: str) -> Dict[str, Any]:
+        """Chat completion parameters shared by direct and batched calls"""
+        return {
+            "model": "gpt-4",
+            "messages": [
+                {"role": "system", "content": "You are an expert educational content editor."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 200
+        }
+    
     async def _call_openai_async(self, prompt: str) -> str:
         """Async call to OpenAI API"""
         try:
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert educational content editor."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            return response.choices[0].message['content'].strip()
+            async with self._openai_rate, self._openai_sem:
+                response = await self._openai.chat.completions.create(**self._chat_params(prompt))
+            return (response.choices[0].message.content or "").strip()
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return ""
+    
+    async def _call_openai_first_line(self, prompt: str) -> str:
+        """Stream a completion and stop as soon as its first line is complete"""
+        try:
+            async with self._openai_rate, self._openai_sem:
+                stream = await self._openai.chat.completions.create(**self._chat_params(prompt), stream=True)
+                
+                response = ""
+                try:
+                    async for chunk in stream:
+                        if chunk.choices:
+                            response += chunk.choices[0].delta.content or ""
+                        if '\n' in response.lstrip():
+                            break
+                finally:
+                    # Closing early drops the connection and stops token generation
+                    await stream.close()
+            
+            return response.strip().split('\n')[0]
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return ""
     
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._http.aclose()
+    
+    def _classify_text(self, text: str) -> _TextTraits:
+        """Gather the heuristics' text statistics in one go"""
+        words = text.split()
+        return _TextTraits(
+            length=len(text),
+            word_count=len(words),
+            long_words=sum(len(word) > 8 for word in words),
+            commas=text.count(','),
+            periods=text.count('.'),
+            has_newline='\n' in text,
+            has_colon=':' in text,
+            has_list_markers=any(marker in text for marker in _LIST_MARKERS),
+            has_connective=_CONNECTIVES_RE.search(text) is not None
+        )
+    
     def _is_complex_text(self, text: str) -> bool:
         """Check if text is complex and might benefit from simplification"""
-        # Simple heuristics for complexity
-        complex_indicators = [
-            len(text.split()) > 20,  # Long sentences
-            len([word for word in text.split() if len(word) > 8]) > 3,  # Many long words
-            text.count(',') > 3,  # Many clauses
-            any(word in text.lower() for word in ['however', 'nevertheless', 'furthermore', 'consequently'])
-        ]
-        return sum(complex_indicators) >= 2
+        return self._classify_text(text).is_complex
     
     def _needs_formatting(self, text: str) -> bool:
         """Check if text would benefit from better formatting"""
-        formatting_indicators = [
-            len(text) > 100 and '\n' not in text,  # Long text without breaks
-            text.count('.') > 2 and not any(marker in text for marker in ['•', '-', '1.', '2.']),  # Multiple points without bullets
-            ':' in text and '\n' not in text  # Lists without proper formatting
-        ]
-        return any(formatting_indicators)
+        return self._classify_text(text).needs_formatting
     
     def apply_suggestion(self, session_id: str, suggestion_id: str, accept: bool) -> bool:
         """Apply or reject a suggestion"""
@@ -266,11 +634,7 @@ class AIFlashcardEditor:
         session = self.active_sessions[session_id]
         
         # Find the suggestion
-        suggestion = None
-        for s in session.suggestions:
-            if id(s) == int(suggestion_id):  # Simple ID matching
-                suggestion = s
-                break
+        suggestion = session.suggestions.get(suggestion_id)
         
         if not suggestion:
             return False
@@ -278,15 +642,17 @@ class AIFlashcardEditor:
         if accept:
             # Apply the suggestion
             if suggestion.type == SuggestionType.CLOZE_CONVERSION:
-                session.current_content['front'] = suggestion.suggested_text
+                session.set_field('front', suggestion.suggested_text)
             else:
                 # Determine which field to update based on suggestion type
                 field = 'front' if 'front' in session.current_content else 'back'
-                session.current_content[field] = suggestion.suggested_text
+                session.set_field(field, suggestion.suggested_text)
             
-            session.accepted_suggestions.append(suggestion_id)
+            session.accepted_suggestions.add(suggestion_id)
         else:
-            session.rejected_suggestions.append(suggestion_id)
+            session.rejected_suggestions.add(suggestion_id)
+        
+        session._pending.pop(suggestion_id, None)
         
         return True
     
@@ -302,53 +668,82 @@ class AIFlashcardEditor:
             'current_content': session.current_content,
             'pending_suggestions': [
                 {
-                    'id': str(id(s)),
+                    'id': suggestion_id,
                     'type': s.type.value,
                     'preview': s.preview,
                     'confidence': s.confidence,
                     'reasoning': s.reasoning
                 }
-                for s in session.suggestions 
-                if str(id(s)) not in session.accepted_suggestions + session.rejected_suggestions
+                for suggestion_id, s in session._pending.items()
             ],
-            'changes_made': session.current_content != session.original_content
+            'changes_made': bool(session._dirty_fields)
         }
     
+    def get_session_state_bytes(self, session_id: str) -> bytes:
+        """Session state serialized to JSON bytes for the HTTP layer"""
+        return orjson.dumps(self.get_session_state(session_id), option=orjson.OPT_NAIVE_UTC)
+    
     def end_session(self, session_id: str) -> Dict[str, Any]:
         """End editing session and return final content"""
         if session_id not in self.active_sessions:
             return {}
         
         session = self.active_sessions[session_id]
-        final_content = session.current_content.copy()
         
-        # Clean up
+        # Clean up; the session is gone, so its content can be handed over without a copy
         del self.active_sessions[session_id]
+        final_content = session.current_content
         
         return {
             'final_content': final_content,
             'suggestions_accepted': len(session.accepted_suggestions),
             'suggestions_rejected': len(session.rejected_suggestions),
-            'total_changes': len([k for k in final_content.keys() 
-                                if final_content[k] != session.original_content.get(k, '')])
+            'total_changes': len(session._dirty_fields)
         }
+    
+    def end_session_bytes(self, session_id: str) -> bytes:
+        """End a session and return its summary serialized to JSON bytes"""
+        return orjson.dumps(self.end_session(session_id), option=orjson.OPT_NAIVE_UTC)
+
+# Enhancement templates, shared by the interactive and batch paths
+ENHANCEMENT_PROMPTS = MappingProxyType({
+    'examples': lambda content, field: f"""
+        Enhance this {field} flashcard content by adding 1-2 relevant, concrete examples.
+        Keep the examples brief and directly related to the concept.
+        
+        Original content: {content}
+        
+        Provide enhanced version with examples integrated naturally.
+        """,
+    
+    'mnemonics': lambda content, field=None: f"""
+        Create a simple, memorable mnemonic device for this flashcard content.
+        The mnemonic should be easy to remember and directly related to the concept.
+        
+        Content: {content}
+        
+        Provide the mnemonic and briefly explain how it helps remember the concept.
+        """,
+    
+    'related_concepts': lambda content, field=None: f"""
+        Based on this flashcard content, suggest 3-5 related concepts that a student should also study.
+        Provide only the concept names, one per line.
+        
+        Content: {content}
+        """
+})
 
 class SmartContentEnhancer:
     """Enhances flashcard content with additional context and examples"""
     
+    _PROMPTS = ENHANCEMENT_PROMPTS
+    
     def __init__(self, ai_editor: AIFlashcardEditor):
         self.ai_editor = ai_editor
     
     async def enhance_with_examples(self, content: str, field: str) -> str:
         """Add relevant examples to flashcard content"""
-        prompt = f"""
-        Enhance this {field} flashcard content by adding 1-2 relevant, concrete examples.
-        Keep the examples brief and directly related to the concept.
-        
-        Original content: {content}
-        
-        Provide enhanced version with examples integrated naturally.
-        """
+        prompt = self._PROMPTS['examples'](content, field)
         
         try:
             response = await self.ai_editor._call_openai_async(prompt)
@@ -359,14 +754,7 @@ class SmartContentEnhancer:
     
     async def add_mnemonics(self, content: str) -> str:
         """Generate mnemonic devices for better memorization"""
-        prompt = f"""
-        Create a simple, memorable mnemonic device for this flashcard content.
-        The mnemonic should be easy to remember and directly related to the concept.
-        
-        Content: {content}
-        
-        Provide the mnemonic and briefly explain how it helps remember the concept.
-        """
+        prompt = self._PROMPTS['mnemonics'](content)
         
         try:
             response = await self.ai_editor._call_openai_async(prompt)
@@ -377,12 +765,7 @@ class SmartContentEnhancer:
     
     async def suggest_related_concepts(self, content: str) -> List[str]:
         """Suggest related concepts for additional study"""
-        prompt = f"""
-        Based on this flashcard content, suggest 3-5 related concepts that a student should also study.
-        Provide only the concept names, one per line.
-        
-        Content: {content}
-        """
+        prompt = self._PROMPTS['related_concepts'](content)
         
         try:
             response = await self.ai_editor._call_openai_async(prompt)
@@ -390,4 +773,87 @@ class SmartContentEnhancer:
             return concepts[:5]  # Limit to 5 suggestions
         except Exception as e:
             print(f"Error suggesting related concepts: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    def _enhancement_requests(self, cards: List[Dict[str, str]], kinds: List[str],
+                              field: str) -> Dict[str, str]:
+        """Map a custom_id of the form '<card index>:<kind>' to its prompt"""
+        return {
+            f"{index}:{kind}": self._PROMPTS[kind](card.get(field, ''), field)
+            for index, card in enumerate(cards)
+            for kind in kinds
+        }
+    
+    def _group_results(self, cards: List[Dict[str, str]],
+                       outputs: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+        """Group raw outputs by card id (or index when a card has none) and kind"""
+        results = {}
+        for custom_id, text in outputs.items():
+            index, kind = custom_id.split(':', 1)
+            card = cards[int(index)]
+            results.setdefault(card.get('id') or index, {})[kind] = text
+        return results
+    
+    async def enhance_now(self, cards: List[Dict[str, str]], kinds: List[str],
+                          field: str = 'back') -> Dict[str, Dict[str, str]]:
+        """Enhance cards immediately with concurrent chat calls, for interactive use"""
+        requests = self._enhancement_requests(cards, kinds, field)
+        responses = await asyncio.gather(
+            *(self.ai_editor._call_openai_async(prompt) for prompt in requests.values())
+        )
+        return self._group_results(cards, dict(zip(requests, responses)))
+    
+    async def enhance_batch(self, cards: List[Dict[str, str]], kinds: List[str],
+                            field: str = 'back',
+                            poll_interval: float = 30.0) -> Dict[str, Dict[str, str]]:
+        """Enhance many cards through the OpenAI Batch API (cheaper, completes within 24h)"""
+        client = self.ai_editor._openai
+        requests = self._enhancement_requests(cards, kinds, field)
+        
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self.ai_editor._chat_params(prompt)
+            })
+            for custom_id, prompt in requests.items()
+        ]
+        
+        try:
+            batch_file = await client.files.create(
+                file=("enhancements.jsonl", b"\n".join(lines)),
+                purpose="batch"
+            )
+            batch = await client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(poll_interval)
+                batch = await client.batches.retrieve(batch.id)
+            
+            if batch.status != "completed" or not batch.output_file_id:
+                print(f"Enhancement batch {batch.id} ended with status {batch.status}")
+                return {}
+            
+            output = await client.files.content(batch.output_file_id)
+            
+            outputs = {}
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                result = orjson.loads(line)
+                response = result.get('response') or {}
+                if response.get('status_code') != 200:
+                    continue
+                message = response['body']['choices'][0]['message']
+                outputs[result['custom_id']] = (message.get('content') or "").strip()
+            
+            return self._group_results(cards, outputs)
+            
+        except Exception as e:
+            print(f"Error running enhancement batch: {e}")
+            return {}
\ No newline at end of file
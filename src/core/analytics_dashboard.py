@@ -5,14 +5,97 @@ Provides comprehensive learning analytics and insights
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
-from collections import defaultdict, Counter
+from dataclasses import dataclass, field
+from collections import defaultdict, Counter, OrderedDict
+from operator import attrgetter
+import gzip
 import json
+import zlib
+
+# Interned mode and topic names; sessions store the int16 codes
+MODE_CODES: Dict[str, int] = {}
+MODE_NAMES: List[str] = []
+TOPIC_CODES: Dict[str, int] = {}
+TOPIC_NAMES: List[str] = []
+
+# One row per recorded session, stored per user in date order
+SESSION_DTYPE = np.dtype([
+    ('duration', 'i2'),
+    ('cards_reviewed', 'i4'),
+    ('accuracy', 'f4'),
+    ('date', 'datetime64[s]'),
+    ('mode', 'i2')
+])
+_INITIAL_SESSION_CAPACITY = 16
+
+# One row per (session, topic), shared by all users
+TOPIC_ROW_DTYPE = np.dtype([
+    ('topic', 'i2'),
+    ('date', 'datetime64[s]'),
+    ('accuracy', 'f4'),
+    ('cards_count', 'i2')
+])
+
+# Parquet layout for saved sessions; topic lists line up with their accuracies and counts
+_SESSION_SCHEMA = pa.schema([
+    ('user_id', pa.dictionary(pa.int32(), pa.string())),
+    ('session_id', pa.string()),
+    ('date', pa.timestamp('s')),
+    ('duration', pa.int16()),
+    ('cards_reviewed', pa.int32()),
+    ('accuracy', pa.float32()),
+    ('mode', pa.dictionary(pa.int16(), pa.string())),
+    ('topics_covered', pa.list_(pa.dictionary(pa.int16(), pa.string()))),
+    ('topic_accuracies', pa.list_(pa.float32())),
+    ('topic_card_counts', pa.list_(pa.int16())),
+    ('difficulty_distribution', pa.map_(pa.string(), pa.int32()))
+])
+
+_NO_TOPICS = np.empty(0, dtype=np.int16)
+_NO_TOPICS.flags.writeable = False
+_NO_SCORES = np.empty(0, dtype=np.float64)
+_NO_SCORES.flags.writeable = False
+
+_OVERVIEW_CACHE_SIZE = 512
+
+# Fixed noise for the mock accuracy trend, shifted by each user's average
+_MOCK_NOISE = np.random.default_rng(0).standard_normal(30).astype(np.float32) * 0.1
+_MOCK_TREND_DATES = pd.date_range(start='2024-01-01', periods=30, freq='D')
+
+def _intern(name: str, codes: Dict[str, int], names: List[str]) -> int:
+    """Return the code for a name, assigning the next one if unseen"""
+    code = codes.get(name)
+    if code is None:
+        code = codes[name] = len(names)
+        names.append(name)
+    return code
+
+def _session_column(sessions: List['SessionAnalytics'], attr: str, dtype) -> np.ndarray:
+    """Read one session attribute straight into an array, without a temporary list"""
+    return np.fromiter(map(attrgetter(attr), sessions), dtype=dtype, count=len(sessions))
+
+def _grown(buf: np.ndarray, needed: int) -> np.ndarray:
+    """Return buf, doubled in capacity as often as needed to hold the given rows"""
+    capacity = len(buf)
+    if needed <= capacity:
+        return buf
+    while needed > capacity:
+        capacity *= 2
+    return np.resize(buf, capacity)
+
+def _lowest_k(codes: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """Codes with the k lowest scores, lowest first"""
+    if codes.size > k:
+        picked = np.argpartition(scores, k)[:k]
+        codes, scores = codes[picked], scores[picked]
+    return codes[np.argsort(scores, kind='stable')]
 
 @dataclass
 class LearningMetrics:
@@ -24,6 +107,11 @@ class LearningMetrics:
     weak_areas: List[str]
     strong_areas: List[str]
     improvement_rate: float
+    # Topic codes behind weak_areas / strong_areas, indexing TOPIC_NAMES
+    weak_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int16), compare=False)
+    strong_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int16), compare=False)
+    # Mean accuracy (0-1) of each weak area, then each strong area
+    area_accuracies: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64), compare=False)
 
 @dataclass
 class SessionAnalytics:
@@ -42,13 +130,79 @@ class LearningAnalytics:
     def __init__(self):
         self.user_data = defaultdict(list)
         self.session_data = defaultdict(list)
-        self.topic_performance = defaultdict(lambda: defaultdict(list))
+        
+        # user_id -> (SESSION_DTYPE buffer grown by doubling, rows used)
+        self._sess: Dict[str, Tuple[np.ndarray, int]] = {}
+        
+        # Topic performance rows for all users, indexed per user
+        self._tp_values = np.empty(64, dtype=TOPIC_ROW_DTYPE)
+        self._tp_used = 0
+        # user_id -> (row indices into _tp_values, rows used)
+        self._tp_rows: Dict[str, Tuple[np.ndarray, int]] = {}
+        
+        # user_id -> (session count, latest session, day computed, metrics)
+        self._metrics_cache: Dict[str, Tuple[int, np.datetime64, Any, LearningMetrics]] = {}
     
     def record_session(self, user_id: str, session_data: Dict[str, Any]):
         """Record a completed study session"""
+        self._record_session(user_id, session_data, datetime.fromisoformat(session_data['date']))
+    
+    def record_sessions(self, user_id: str, sessions: List[Dict[str, Any]]):
+        """Record a batch of completed study sessions, parsing their dates in one pass"""
+        if not sessions:
+            return
+        
+        dates = pd.to_datetime([s['date'] for s in sessions], format='ISO8601').to_pydatetime()
+        for session_data, date in zip(sessions, dates):
+            self._record_session(user_id, session_data, date)
+    
+    def save(self, path: str):
+        """Write every recorded session to a zstd-compressed Parquet file"""
+        rows = []
+        for user_id, sessions in self.session_data.items():
+            # Topic rows were appended session by session, so they split back in order
+            indices, count = self._tp_rows.get(user_id, (np.empty(0, dtype=np.int64), 0))
+            topic_values = self._tp_values[indices[:count]]
+            bounds = np.cumsum([len(s.topics_covered) for s in sessions])[:-1]
+            accuracies = np.split(topic_values['accuracy'], bounds)
+            card_counts = np.split(topic_values['cards_count'], bounds)
+            
+            for session, topic_accuracies, topic_card_counts in zip(sessions, accuracies, card_counts):
+                rows.append({
+                    'user_id': user_id,
+                    'session_id': session.session_id,
+                    'date': session.date,
+                    'duration': session.duration,
+                    'cards_reviewed': session.cards_reviewed,
+                    'accuracy': session.accuracy,
+                    'mode': session.mode,
+                    'topics_covered': session.topics_covered,
+                    'topic_accuracies': topic_accuracies,
+                    'topic_card_counts': topic_card_counts,
+                    'difficulty_distribution': list(session.difficulty_distribution.items())
+                })
+        
+        table = pa.Table.from_pylist(rows, schema=_SESSION_SCHEMA)
+        pq.write_table(table, path, compression='zstd')
+    
+    @classmethod
+    def load(cls, path: str) -> 'LearningAnalytics':
+        """Rebuild analytics from a Parquet file written by save"""
+        analytics = cls()
+        for row in pq.read_table(path).to_pylist():
+            topics = row['topics_covered']
+            row['topic_accuracies'] = dict(zip(topics, row['topic_accuracies']))
+            row['topic_card_counts'] = dict(zip(topics, row['topic_card_counts']))
+            row['difficulty_distribution'] = dict(row['difficulty_distribution'])
+            analytics._record_session(row['user_id'], row, row['date'])
+        
+        return analytics
+    
+    def _record_session(self, user_id: str, session_data: Dict[str, Any], date: datetime):
+        """Store one session whose date has already been parsed"""
         session_analytics = SessionAnalytics(
             session_id=session_data['session_id'],
-            date=datetime.fromisoformat(session_data['date']),
+            date=date,
             duration=session_data['duration'],
             cards_reviewed=session_data['cards_reviewed'],
             accuracy=session_data['accuracy'],
@@ -58,109 +212,160 @@ class LearningAnalytics:
         )
         
         self.session_data[user_id].append(session_analytics)
+        self._metrics_cache.pop(user_id, None)
+        self._append_session(user_id, session_analytics.date, session_data['duration'],
+                             session_data['cards_reviewed'], session_data['accuracy'],
+                             _intern(session_data['mode'], MODE_CODES, MODE_NAMES))
         
         # Update topic performance
-        for topic in session_data['topics_covered']:
-            self.topic_performance[user_id][topic].append({
-                'date': session_analytics.date,
-                'accuracy': session_data.get('topic_accuracies', {}).get(topic, session_analytics.accuracy),
-                'cards_count': session_data.get('topic_card_counts', {}).get(topic, 1)
-            })
+        topics = session_data['topics_covered']
+        topic_accuracies = session_data.get('topic_accuracies', {})
+        topic_card_counts = session_data.get('topic_card_counts', {})
+        self._append_topics(
+            user_id, session_analytics.date,
+            [_intern(topic, TOPIC_CODES, TOPIC_NAMES) for topic in topics],
+            [topic_accuracies.get(topic, session_analytics.accuracy) for topic in topics],
+            [topic_card_counts.get(topic, 1) for topic in topics]
+        )
+    
+    def _append_session(self, user_id: str, date: datetime, duration: int,
+                        cards_reviewed: int, accuracy: float, mode: int):
+        """Insert a session row into the user's date-ordered buffer"""
+        buf, used = self._sess.get(user_id, (None, 0))
+        if buf is None:
+            buf = np.empty(_INITIAL_SESSION_CAPACITY, dtype=SESSION_DTYPE)
+        elif used == len(buf):
+            buf = np.resize(buf, used * 2)
+        
+        stamp = np.datetime64(date, 's')
+        # Sessions normally arrive in order; late ones shift newer rows right
+        if used and stamp < buf['date'][used - 1]:
+            pos = int(np.searchsorted(buf['date'][:used], stamp, side='right'))
+            buf[pos + 1:used + 1] = buf[pos:used]
+        else:
+            pos = used
+        
+        buf[pos] = (duration, cards_reviewed, accuracy, stamp, mode)
+        self._sess[user_id] = (buf, used + 1)
+    
+    def _append_topics(self, user_id: str, date: datetime, topic_ids: List[int],
+                       accuracies: List[float], card_counts: List[int]):
+        """Append one session's topic rows to the shared topic table"""
+        used = self._tp_used
+        end = used + len(topic_ids)
+        self._tp_values = _grown(self._tp_values, end)
+        
+        values = self._tp_values[used:end]
+        values['topic'] = topic_ids
+        values['date'] = np.datetime64(date, 's')
+        values['accuracy'] = accuracies
+        values['cards_count'] = card_counts
+        self._tp_used = end
+        
+        # Index the new rows under the user so lookups never scan other users
+        rows, count = self._tp_rows.get(user_id, (np.empty(16, dtype=np.int64), 0))
+        rows = _grown(rows, count + len(topic_ids))
+        rows[count:count + len(topic_ids)] = np.arange(used, end)
+        self._tp_rows[user_id] = (rows, count + len(topic_ids))
     
     def generate_user_metrics(self, user_id: str) -> LearningMetrics:
         """Generate comprehensive metrics for a user"""
-        sessions = self.session_data[user_id]
+        buf, used = self._sess.get(user_id, (None, 0))
         
-        if not sessions:
+        if not used:
             return LearningMetrics(0, 0, 0.0, 0, 0, [], [], 0.0)
         
-        # Calculate basic metrics
-        total_cards_reviewed = sum(s.cards_reviewed for s in sessions)
-        total_study_time = sum(s.duration for s in sessions)
-        average_accuracy = np.mean([s.accuracy for s in sessions])
+        # The streak depends on today's date, so cached metrics expire daily
+        sessions = buf[:used]
+        key = (used, sessions['date'][-1], datetime.now().date())
+        cached = self._metrics_cache.get(user_id)
+        if cached and cached[:3] == key:
+            return cached[3]
+        
+        # Calculate basic metrics and improvement rate
+        (total_cards_reviewed, total_study_time,
+         average_accuracy, improvement_rate) = self._session_stats(sessions)
         
         # Calculate study streak
-        study_streak = self._calculate_study_streak(sessions)
+        study_streak = self._calculate_study_streak(sessions['date'])
         
         # Identify weak and strong areas
-        weak_areas, strong_areas = self._identify_performance_areas(user_id)
-        
-        # Calculate improvement rate
-        improvement_rate = self._calculate_improvement_rate(sessions)
+        weak_ids, strong_ids, area_accuracies = self._identify_performance_areas(user_id)
         
-        return LearningMetrics(
+        metrics = LearningMetrics(
             total_cards_generated=total_cards_reviewed,  # Simplified
             total_cards_reviewed=total_cards_reviewed,
             average_accuracy=average_accuracy,
             study_streak=study_streak,
             total_study_time=total_study_time,
-            weak_areas=weak_areas,
-            strong_areas=strong_areas,
-            improvement_rate=improvement_rate
+            weak_areas=[TOPIC_NAMES[c] for c in weak_ids],
+            strong_areas=[TOPIC_NAMES[c] for c in strong_ids],
+            improvement_rate=improvement_rate,
+            weak_ids=weak_ids,
+            strong_ids=strong_ids,
+            area_accuracies=area_accuracies
         )
+        self._metrics_cache[user_id] = (*key, metrics)
+        
+        return metrics
     
-    def _calculate_study_streak(self, sessions: List[SessionAnalytics]) -> int:
+    def _calculate_study_streak(self, dates: np.ndarray) -> int:
         """Calculate current study streak in days"""
-        if not sessions:
-            return 0
-        
-        # Sort sessions by date
-        sorted_sessions = sorted(sessions, key=lambda x: x.date, reverse=True)
+        today = np.datetime64(datetime.now().date(), 'D')
+        days = np.unique(dates.astype('datetime64[D]'))
+        days = days[days <= today]
         
-        streak = 0
-        current_date = datetime.now().date()
-        
-        for session in sorted_sessions:
-            session_date = session.date.date()
-            
-            if session_date == current_date or session_date == current_date - timedelta(days=streak):
-                if session_date == current_date - timedelta(days=streak):
-                    streak += 1
-                current_date = session_date
-            else:
-                break
+        # The streak is still alive if the last study day was today or yesterday
+        if not days.size or days[-1] < today - 1:
+            return 0
         
-        return streak
+        breaks = np.flatnonzero(np.diff(days).astype(np.int64) != 1)
+        return int(days.size - breaks[-1] - 1) if breaks.size else int(days.size)
     
-    def _identify_performance_areas(self, user_id: str) -> Tuple[List[str], List[str]]:
-        """Identify weak and strong performance areas"""
-        topic_performance = self.topic_performance[user_id]
-        
-        topic_averages = {}
-        for topic, performances in topic_performance.items():
-            if performances:
-                avg_accuracy = np.mean([p['accuracy'] for p in performances])
-                topic_averages[topic] = avg_accuracy
-        
-        if not topic_averages:
-            return [], []
-        
-        overall_average = np.mean(list(topic_averages.values()))
-        
-        weak_areas = [topic for topic, avg in topic_averages.items() 
-                     if avg < overall_average - 0.1]
-        strong_areas = [topic for topic, avg in topic_averages.items() 
-                       if avg > overall_average + 0.1]
-        
-        return weak_areas[:5], strong_areas[:5]  # Limit to top 5
+    def _identify_performance_areas(self, user_id: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Identify weak and strong performance areas as topic codes, plus their mean accuracies"""
+        rows, count = self._tp_rows.get(user_id, (None, 0))
+        if not count:
+            return _NO_TOPICS, _NO_TOPICS, _NO_SCORES
+        
+        values = self._tp_values[rows[:count]]
+        ids = values['topic']
+        sums = np.bincount(ids, weights=values['accuracy'])
+        counts = np.bincount(ids)
+        
+        codes = np.flatnonzero(counts)
+        topic_averages = sums[codes] / counts[codes]
+        overall_average = topic_averages.mean()
+        
+        # Limit to the 5 weakest and 5 strongest qualifying topics
+        weak = topic_averages < overall_average - 0.1
+        strong = topic_averages > overall_average + 0.1
+        weak_ids = _lowest_k(codes[weak], topic_averages[weak], 5).astype(np.int16)
+        strong_ids = _lowest_k(codes[strong], -topic_averages[strong], 5).astype(np.int16)
+        
+        area_ids = np.concatenate((weak_ids, strong_ids))
+        area_accuracies = sums[area_ids] / counts[area_ids]
+        
+        return weak_ids, strong_ids, area_accuracies
     
-    def _calculate_improvement_rate(self, sessions: List[SessionAnalytics]) -> float:
-        """Calculate improvement rate over time"""
-        if len(sessions) < 2:
-            return 0.0
-        
-        # Sort sessions by date
-        sorted_sessions = sorted(sessions, key=lambda x: x.date)
-        
-        # Calculate trend using simple linear regression
-        x = np.arange(len(sorted_sessions))
-        y = np.array([s.accuracy for s in sorted_sessions])
-        
-        if len(x) > 1:
-            slope = np.polyfit(x, y, 1)[0]
-            return float(slope * 100)  # Convert to percentage
-        
-        return 0.0
+    def _session_stats(self, sessions: np.ndarray) -> Tuple[int, int, float, float]:
+        """Card and time totals, mean accuracy and improvement rate from date-ordered sessions"""
+        n = len(sessions)
+        # Read the strided accuracy field once; mean and slope share the contiguous copy
+        accuracies = sessions['accuracy'].astype(np.float64)
+        average_accuracy = accuracies.sum() / n
+        
+        improvement_rate = 0.0
+        if n > 1:
+            # Least-squares slope against x = 0..n-1, where sum((x - x_mean)^2) = n(n^2 - 1)/12
+            centered_x = np.arange(n, dtype=np.float64) - (n - 1) / 2
+            slope = np.dot(centered_x, accuracies) / (n * (n * n - 1) / 12.0)
+            improvement_rate = float(slope * 100)  # Convert to percentage
+        
+        return (int(sessions['cards_reviewed'].sum(dtype=np.int64)),
+                int(sessions['duration'].sum(dtype=np.int64)),
+                float(average_accuracy),
+                improvement_rate)
 
 class VisualizationEngine:
     """Creates interactive visualizations for learning analytics"""
@@ -174,9 +379,45 @@ class VisualizationEngine:
             'error': '#ef4444',
             'info': '#06b6d4'
         }
+        # Gzipped overview HTML keyed on the metrics values
+        self._overview_cache: OrderedDict = OrderedDict()
+    
+    def create_dashboard_page(self, user_id: str, metrics: LearningMetrics,
+                              sessions: List[SessionAnalytics]) -> str:
+        """Compose all dashboard figures into one page that loads plotly.js once"""
+        figures = [
+            self.create_performance_overview(metrics, include_plotlyjs='cdn', full_html=False),
+            self.create_study_heatmap(user_id, sessions, include_plotlyjs=False, full_html=False),
+            self.create_progress_timeline(sessions, include_plotlyjs=False, full_html=False)
+        ]
+        return '<html>\n<head><meta charset="utf-8" /></head>\n<body>\n' + '\n'.join(figures) + '\n</body>\n</html>'
     
-    def create_performance_overview(self, metrics: LearningMetrics) -> str:
+    def create_performance_overview(self, metrics: LearningMetrics,
+                                    include_plotlyjs: Any = 'cdn', full_html: bool = True) -> str:
         """Create performance overview dashboard"""
+        return gzip.decompress(self.create_performance_overview_gzip(metrics, include_plotlyjs, full_html)).decode()
+    
+    def create_performance_overview_gzip(self, metrics: LearningMetrics,
+                                         include_plotlyjs: Any = 'cdn', full_html: bool = True) -> bytes:
+        """Performance overview HTML as gzip bytes, for Content-Encoding: gzip responses"""
+        key = (metrics.total_cards_generated, metrics.total_cards_reviewed, metrics.average_accuracy,
+               metrics.study_streak, metrics.total_study_time, tuple(metrics.weak_areas),
+               tuple(metrics.strong_areas), tuple(metrics.area_accuracies.tolist()), metrics.improvement_rate,
+               include_plotlyjs, full_html)
+        body = self._overview_cache.get(key)
+        if body is not None:
+            self._overview_cache.move_to_end(key)
+            return body
+        
+        body = gzip.compress(self._build_performance_overview(metrics, include_plotlyjs, full_html).encode(), 1)
+        self._overview_cache[key] = body
+        if len(self._overview_cache) > _OVERVIEW_CACHE_SIZE:
+            self._overview_cache.popitem(last=False)
+        return body
+    
+    def _build_performance_overview(self, metrics: LearningMetrics, include_plotlyjs: Any,
+                                    full_html: bool) -> str:
+        """Build the performance overview figure HTML"""
         fig = make_subplots(
             rows=2, cols=2,
             subplot_titles=('Study Progress', 'Accuracy Trend', 'Time Distribution', 'Topic Performance'),
@@ -210,13 +451,11 @@ class VisualizationEngine:
         )
         
         # Mock accuracy trend (in production, use real historical data)
-        dates = pd.date_range(start='2024-01-01', periods=30, freq='D')
-        accuracy_trend = np.random.normal(metrics.average_accuracy, 0.1, 30)
-        accuracy_trend = np.clip(accuracy_trend, 0, 1)
+        accuracy_trend = np.clip(_MOCK_NOISE + metrics.average_accuracy, 0, 1)
         
         fig.add_trace(
             go.Scatter(
-                x=dates,
+                x=_MOCK_TREND_DATES,
                 y=accuracy_trend * 100,
                 mode='lines+markers',
                 name='Accuracy Trend',
@@ -244,9 +483,13 @@ class VisualizationEngine:
         # Topic performance bar chart
         all_areas = metrics.weak_areas + metrics.strong_areas
         if all_areas:
-            # Mock performance scores
-            performance_scores = [60 + np.random.randint(-20, 40) for _ in all_areas]
-            colors = ['red' if area in metrics.weak_areas else 'green' for area in all_areas]
+            # Per-topic accuracy as a percentage; metrics built without it fall back to the overall average
+            if len(metrics.area_accuracies) == len(all_areas):
+                performance_scores = np.round(metrics.area_accuracies * 100, 1)
+            else:
+                performance_scores = np.full(len(all_areas), round(metrics.average_accuracy * 100, 1))
+            # Weak areas come first, so the colours follow from position alone
+            colors = np.repeat(['red', 'green'], [len(metrics.weak_areas), len(metrics.strong_areas)])
             
             fig.add_trace(
                 go.Bar(
@@ -265,9 +508,10 @@ class VisualizationEngine:
             title_x=0.5
         )
         
-        return fig.to_html(include_plotlyjs='cdn')
+        return fig.to_html(include_plotlyjs=include_plotlyjs, full_html=full_html)
     
-    def create_study_heatmap(self, user_id: str, sessions: List[SessionAnalytics]) -> str:
+    def create_study_heatmap(self, user_id: str, sessions: List[SessionAnalytics],
+                             include_plotlyjs: Any = 'cdn', full_html: bool = True) -> str:
         """Create study activity heatmap"""
         if not sessions:
             return "<p>No study data available</p>"
@@ -277,26 +521,17 @@ class VisualizationEngine:
         start_date = end_date - timedelta(days=89)
         date_range = pd.date_range(start=start_date, end=end_date, freq='D')
         
-        # Create activity matrix
-        activity_data = defaultdict(int)
-        for session in sessions:
-            session_date = session.date.date()
-            if start_date <= session_date <= end_date:
-                activity_data[session_date] += session.duration
+        # Sum study minutes per day offset from the start of the window
+        offsets = (_session_column(sessions, 'date', 'datetime64[D]')
+                   - np.datetime64(start_date, 'D')).astype(np.int64)
+        durations = _session_column(sessions, 'duration', np.int64)
+        in_window = (offsets >= 0) & (offsets < len(date_range))
+        values = np.bincount(offsets[in_window], weights=durations[in_window],
+                             minlength=len(date_range)).astype(np.int64)
         
         # Prepare data for heatmap
-        weeks = []
-        days = []
-        values = []
-        
-        for date in date_range:
-            week = date.isocalendar()[1]
-            day = date.weekday()
-            value = activity_data.get(date.date(), 0)
-            
-            weeks.append(week)
-            days.append(day)
-            values.append(value)
+        weeks = date_range.isocalendar()['week'].to_numpy()
+        days = date_range.weekday.to_numpy()
         
         # Create heatmap
         fig = go.Figure(data=go.Heatmap(
@@ -319,19 +554,21 @@ class VisualizationEngine:
             )
         )
         
-        return fig.to_html(include_plotlyjs='cdn')
+        return fig.to_html(include_plotlyjs=include_plotlyjs, full_html=full_html)
     
-    def create_progress_timeline(self, sessions: List[SessionAnalytics]) -> str:
+    def create_progress_timeline(self, sessions: List[SessionAnalytics],
+                                 include_plotlyjs: Any = 'cdn', full_html: bool = True) -> str:
         """Create progress timeline visualization"""
         if not sessions:
             return "<p>No session data available</p>"
         
         # Sort sessions by date
-        sorted_sessions = sorted(sessions, key=lambda x: x.date)
+        dates = _session_column(sessions, 'date', 'datetime64[us]')
+        order = np.argsort(dates, kind='stable')
         
-        dates = [s.date for s in sorted_sessions]
-        accuracies = [s.accuracy * 100 for s in sorted_sessions]
-        study_times = [s.duration for s in sorted_sessions]
+        dates = dates[order]
+        accuracies = _session_column(sessions, 'accuracy', np.float64)[order] * 100
+        study_times = _session_column(sessions, 'duration', np.int64)[order]
         
         # Create subplot with secondary y-axis
         fig = make_subplots(specs=[[{"secondary_y": True}]])
@@ -371,7 +608,7 @@ class VisualizationEngine:
             hovermode='x unified'
         )
         
-        return fig.to_html(include_plotlyjs='cdn')
+        return fig.to_html(include_plotlyjs=include_plotlyjs, full_html=full_html)
 
 class SmartReviewScheduler:
     """Intelligent scheduling system for optimal review timing"""
@@ -399,28 +636,51 @@ class SmartReviewScheduler:
         
         interval_days = self.spaced_repetition_intervals[interval_index]
         
-        # Add some randomization to avoid clustering
-        randomization = np.random.randint(-1, 2)  # -1, 0, or 1 day
+        # Spread reviews by -1, 0 or 1 day per card to avoid clustering
+        randomization = zlib.crc32(card_id.encode()) % 3 - 1
         final_interval = max(1, interval_days + randomization)
         
         return datetime.now() + timedelta(days=final_interval)
     
+    def calculate_next_review_batch(self, card_ids: List[str],
+                                    performance_histories: List[List[Dict[str, Any]]]) -> np.ndarray:
+        """Next review times for many cards at once, as a datetime64[us] array"""
+        latest = [history[-1] if history else None for history in performance_histories]
+        accuracies = np.fromiter((p.get('accuracy', 0.5) if p else 0.0 for p in latest),
+                                 dtype=np.float32, count=len(latest))
+        interval_indices = np.fromiter((p.get('interval_index', 0) if p else 0 for p in latest),
+                                       dtype=np.int64, count=len(latest))
+        
+        # Determine interval based on performance
+        intervals = np.asarray(self.spaced_repetition_intervals)
+        interval_indices = np.where(accuracies >= 0.9,
+                                    np.minimum(interval_indices + 1, len(intervals) - 1),
+                                    np.where(accuracies >= 0.7, interval_indices,
+                                             np.maximum(interval_indices - 1, 0)))
+        
+        # Same per-card -1/0/+1 day spread as calculate_next_review
+        jitter = np.fromiter((zlib.crc32(card_id.encode()) for card_id in card_ids),
+                             dtype=np.int64, count=len(card_ids)) % 3 - 1
+        final_intervals = np.maximum(1, intervals[interval_indices] + jitter)
+        
+        # Cards without history are reviewed tomorrow
+        has_history = np.fromiter((p is not None for p in latest), dtype=bool, count=len(latest))
+        final_intervals = np.where(has_history, final_intervals, 1)
+        
+        return np.datetime64(datetime.now(), 'us') + final_intervals.astype('timedelta64[D]')
+    
     def get_cards_due_for_review(self, user_id: str, all_cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Get cards that are due for review"""
-        due_cards = []
-        current_time = datetime.now()
-        
-        for card in all_cards:
-            next_review = card.get('next_review')
-            if next_review:
-                next_review_time = datetime.fromisoformat(next_review)
-                if next_review_time <= current_time:
-                    due_cards.append(card)
-            else:
-                # New card, add to review
-                due_cards.append(card)
+        if not all_cards:
+            return []
+        
+        # New cards have no next_review and parse to NaT, so they are always due
+        next_reviews = np.array([card.get('next_review') or 'NaT' for card in all_cards],
+                                dtype='datetime64[us]')
+        current_time = np.datetime64(datetime.now(), 'us')
+        due_mask = np.isnat(next_reviews) | (next_reviews <= current_time)
         
-        return due_cards
+        return [all_cards[i] for i in np.flatnonzero(due_mask)]
     
     def suggest_optimal_study_time(self, user_id: str, historical_performance: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Suggest optimal study time based on user patterns"""
@@ -433,24 +693,15 @@ class SmartReviewScheduler:
             }
         
         # Analyze performance by time of day
-        time_performance = defaultdict(list)
-        for session in historical_performance:
-            hour = datetime.fromisoformat(session['date']).hour
-            time_performance[hour].append(session['accuracy'])
-        
-        # Find best performing time
-        best_hour = 9  # default
-        best_accuracy = 0
+        history = pd.DataFrame(historical_performance)
+        hours = pd.to_datetime(history['date'], format='ISO8601').dt.hour
+        hourly_accuracy = history['accuracy'].groupby(hours, sort=False).mean()
         
-        for hour, accuracies in time_performance.items():
-            avg_accuracy = np.mean(accuracies)
-            if avg_accuracy > best_accuracy:
-                best_accuracy = avg_accuracy
-                best_hour = hour
+        # Find best performing time, keeping the default when nothing scored above zero
+        best_hour = int(hourly_accuracy.idxmax()) if hourly_accuracy.max() > 0 else 9
         
         # Recommend duration based on historical patterns
-        durations = [session['duration'] for session in historical_performance]
-        recommended_duration = int(np.median(durations)) if durations else 30
+        recommended_duration = int(history['duration'].median())
         
         return {
             'recommended_time': f"{best_hour:02d}:00",
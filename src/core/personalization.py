@@ -4,11 +4,47 @@ Provides different study modes and personalized learning experiences
 """
 
 from enum import Enum
-from typing import Dict, List, Any, Optional
+from typing import Deque, Dict, List, Any
 from dataclasses import dataclass
-import json
+import itertools
 import random
-from datetime import datetime, timedelta
+import time
+import numpy as np
+from datetime import datetime
+from functools import lru_cache
+from collections import Counter, deque, namedtuple
+
+@lru_cache(maxsize=8192)
+def _iso_to_timestamp(value: str) -> float:
+    """Parse an ISO date to epoch seconds, memoized across sessions"""
+    return datetime.fromisoformat(value).timestamp()
+
+_NEW_CARD_PRIORITY = 999
+
+def _review_priorities(now_ts: float, due_ts: np.ndarray) -> np.ndarray:
+    """Whole days each card is overdue; never-reviewed cards (NaN) get top priority"""
+    days = np.floor_divide(now_ts - due_ts, 86400)
+    return np.where(np.isnan(due_ts), _NEW_CARD_PRIORITY, days).astype(np.int64)
+
+# Per-card SM-2 state for a whole deck, one array per field
+SRState = namedtuple('SRState', 'reps ef interval last_ts')
+
+_SM2_INITIAL_EF = 2.5
+_SM2_MIN_EF = 1.3
+
+def sm2_step(state: SRState, grades: np.ndarray, now_ts: float) -> SRState:
+    """Apply one SM-2 review (grades 0-5, below 3 restarts the card) to every card at once"""
+    grades = np.asarray(grades)
+    passed = grades >= 3
+    q = 5 - grades
+    ef = np.maximum(state.ef + (0.1 - q * (0.08 + q * 0.02)), _SM2_MIN_EF)
+    interval = np.select(
+        [~passed | (state.reps == 0), state.reps == 1],
+        [1, 6],
+        np.round(state.interval * state.ef)
+    )
+    reps = np.where(passed, state.reps + 1, 0)
+    return SRState(reps, ef, interval, np.full(len(grades), now_ts))
 
 class StudyMode(Enum):
     BASIC_EDUCATIONAL = "basic_educational"
@@ -17,6 +53,38 @@ class StudyMode(Enum):
     FAST_REVIEW = "fast_review"
     SPACED_REPETITION = "spaced_repetition"
 
+_PERFORMANCE_HISTORY_LIMIT = 30
+
+# Placeholder distractors (in production, use AI to generate better distractors)
+_DISTRACTORS = (
+    "Alternative answer 1",
+    "Alternative answer 2",
+    "Alternative answer 3"
+)
+
+# Every ordering of the four choices, so a shuffle is a single random draw
+_PERM4 = tuple(itertools.permutations(range(4)))
+
+def _ordered_choices(correct_answer: str, permutation: int) -> List[str]:
+    """The correct answer and distractors in the given _PERM4 ordering"""
+    items = (correct_answer, *_DISTRACTORS)
+    return [items[i] for i in _PERM4[permutation]]
+
+@lru_cache(maxsize=4096)
+def _mc_choices(card_id: Any, correct_answer: str) -> tuple:
+    """Shuffled answer choices, seeded by the card so repeat sessions reuse them"""
+    permutation = random.Random(f"{card_id}:{correct_answer}").randrange(len(_PERM4))
+    return tuple(_ordered_choices(correct_answer, permutation))
+
+_MODE_BY_VALUE = {mode.value: mode for mode in StudyMode}
+
+_REV_Q_PREFIX = "What question would have this answer: "
+
+_DIFFICULTY_ORDER = {'easy': 1, 'medium': 2, 'hard': 3}
+
+# Decks at least this large are simplified in one batch pass
+_FAST_REVIEW_BATCH_MIN = 256
+
 class CardStyle(Enum):
     DEFINITION_BASED = "definition_based"
     MULTIPLE_CHOICE = "multiple_choice"
@@ -24,7 +92,7 @@ class CardStyle(Enum):
     REVERSE_QUESTIONING = "reverse_questioning"
     SCENARIO_BASED = "scenario_based"
 
-@dataclass
+@dataclass(slots=True)
 class StudySession:
     session_id: str
     user_id: str
@@ -35,16 +103,21 @@ class StudySession:
     responses: List[Dict[str, Any]]
     settings: Dict[str, Any]
 
-@dataclass
+@dataclass(slots=True)
 class PersonalizationProfile:
     user_id: str
     preferred_modes: List[StudyMode]
     preferred_styles: List[CardStyle]
     difficulty_preference: str
     study_time_preference: int  # minutes
-    performance_history: List[Dict[str, Any]]
+    performance_history: Deque[Dict[str, Any]]
     learning_goals: List[str]
     weak_areas: List[str]
+    
+    def __post_init__(self):
+        # Keep only recent performance history; appends drop the oldest entry
+        if not isinstance(self.performance_history, deque):
+            self.performance_history = deque(self.performance_history, maxlen=_PERFORMANCE_HISTORY_LIMIT)
 
 class FlashcardPersonalizer:
     """Handles personalization of flashcard presentation and study modes"""
@@ -52,6 +125,16 @@ class FlashcardPersonalizer:
     def __init__(self):
         self.user_profiles = {}
         self.mode_configurations = self._initialize_mode_configurations()
+        # Per-mode card settings; each card gets its own copy
+        self._mode_settings = {
+            mode: {
+                'time_limit': config.get('time_per_card', 30),
+                'show_hints': config.get('show_hints', True),
+                'allow_retries': config.get('allow_retries', True),
+                'feedback_detail': config.get('feedback_detail', 'comprehensive')
+            }
+            for mode, config in self.mode_configurations.items()
+        }
     
     def _initialize_mode_configurations(self) -> Dict[StudyMode, Dict[str, Any]]:
         """Initialize configuration for different study modes"""
@@ -121,7 +204,7 @@ class FlashcardPersonalizer:
         
         # Create session
         session = StudySession(
-            session_id=f"session_{user_id}_{datetime.now().timestamp()}",
+            session_id=f"session_{user_id}_{time.time_ns()}",
             user_id=user_id,
             mode=mode,
             cards=personalized_cards,
@@ -139,35 +222,42 @@ class FlashcardPersonalizer:
         """Personalize cards based on mode and user profile"""
         
         personalized_cards = []
-        mode_config = self.mode_configurations[mode]
-        
-        for card in cards:
+        mode_settings = self._mode_settings[mode]
+        transform = self._MODE_TRANSFORMS.get(mode)
+        batch_simplify = mode == StudyMode.FAST_REVIEW and len(cards) >= _FAST_REVIEW_BATCH_MIN
+        if batch_simplify:
+            transform = None
+        
+        # Flag cards touching a weak area in one pass before transforming them
+        weak_set = frozenset(profile.weak_areas)
+        is_weak = np.fromiter((bool(card.get('tags')) and not weak_set.isdisjoint(card['tags'])
+                               for card in cards),
+                              dtype=bool, count=len(cards))
+        
+        for card, card_is_weak in zip(cards, is_weak.tolist()):
             personalized_card = card.copy()
             
             # Apply style transformations based on mode
-            if mode == StudyMode.EXAM_PREP:
-                personalized_card = self._convert_to_multiple_choice(personalized_card)
-            elif mode == StudyMode.CHALLENGE:
-                personalized_card = self._convert_to_reverse_questioning(personalized_card)
-            elif mode == StudyMode.FAST_REVIEW:
-                personalized_card = self._simplify_for_fast_review(personalized_card)
+            if transform:
+                personalized_card = transform(self, personalized_card)
             
-            # Add mode-specific metadata
-            personalized_card['mode_settings'] = {
-                'time_limit': mode_config.get('time_per_card', 30),
-                'show_hints': mode_config.get('show_hints', True),
-                'allow_retries': mode_config.get('allow_retries', True),
-                'feedback_detail': mode_config.get('feedback_detail', 'comprehensive')
-            }
+            # Add mode-specific metadata, copied so callers can't change the mode defaults
+            personalized_card['mode_settings'] = dict(mode_settings)
             
             # Add difficulty adjustment based on user performance
-            if profile.weak_areas and any(area in card.get('tags', []) for area in profile.weak_areas):
+            if card_is_weak:
                 personalized_card['adjusted_difficulty'] = 'easier'
-                personalized_card['mode_settings']['time_limit'] += 10
-                personalized_card['mode_settings']['show_hints'] = True
+                personalized_card['mode_settings'] = {
+                    **mode_settings,
+                    'time_limit': mode_settings['time_limit'] + 10,
+                    'show_hints': True
+                }
             
             personalized_cards.append(personalized_card)
         
+        if batch_simplify:
+            self._simplify_for_fast_review_batch(personalized_cards)
+        
         # Reorder cards based on mode strategy
         if mode == StudyMode.SPACED_REPETITION:
             personalized_cards = self._apply_spaced_repetition_order(personalized_cards, profile)
@@ -181,16 +271,12 @@ class FlashcardPersonalizer:
         if card.get('type') == 'multiple_choice':
             return card
         
-        # Generate distractors (in production, use AI to generate better distractors)
         correct_answer = card.get('back', '')
-        distractors = [
-            "Alternative answer 1",
-            "Alternative answer 2", 
-            "Alternative answer 3"
-        ]
-        
-        choices = [correct_answer] + distractors
-        random.shuffle(choices)
+        card_id = card.get('id')
+        if card_id is not None:
+            choices = list(_mc_choices(card_id, correct_answer))
+        else:
+            choices = _ordered_choices(correct_answer, random.randrange(len(_PERM4)))
         
         card['type'] = 'multiple_choice'
         card['choices'] = choices
@@ -204,7 +290,7 @@ class FlashcardPersonalizer:
         original_front = card.get('front', '')
         original_back = card.get('back', '')
         
-        card['front'] = f"What question would have this answer: {original_back}"
+        card['front'] = _REV_Q_PREFIX + original_back
         card['back'] = original_front
         card['type'] = 'reverse_questioning'
         
@@ -224,33 +310,81 @@ class FlashcardPersonalizer:
         
         return card
     
+    def _simplify_for_fast_review_batch(self, cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Simplify a whole deck for fast review, testing lengths in one pass per field"""
+        for field, limit in (('front', 100), ('back', 150)):
+            texts = [card.get(field, '') for card in cards]
+            lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+            for i in np.flatnonzero(lengths > limit).tolist():
+                cards[i][field] = texts[i][:limit - 3] + "..."
+        
+        for card in cards:
+            card['simplified'] = True
+        
+        return cards
+    
+    # Card transform per study mode, looked up once per session
+    _MODE_TRANSFORMS = {
+        StudyMode.EXAM_PREP: _convert_to_multiple_choice,
+        StudyMode.CHALLENGE: _convert_to_reverse_questioning,
+        StudyMode.FAST_REVIEW: _simplify_for_fast_review
+    }
+    
+    def _sr_state(self, cards: List[Dict[str, Any]]) -> SRState:
+        """Gather the deck's SM-2 fields into arrays; unreviewed cards have NaN last_ts"""
+        n = len(cards)
+        reps = np.fromiter((card.get('repetitions', 0) for card in cards), dtype=np.int64, count=n)
+        ef = np.fromiter((card.get('ease_factor', _SM2_INITIAL_EF) for card in cards), dtype=np.float64, count=n)
+        interval = np.fromiter((card.get('interval', 0) for card in cards), dtype=np.float64, count=n)
+        last_ts = np.full(n, np.nan)
+        for i, card in enumerate(cards):
+            # Writers may store _last_reviewed_ts (epoch seconds) to skip parsing
+            ts = card.get('_last_reviewed_ts')
+            if ts is None and card.get('last_reviewed'):
+                ts = _iso_to_timestamp(card['last_reviewed'])
+            if ts is not None:
+                last_ts[i] = ts
+        
+        return SRState(reps, ef, interval, last_ts)
+    
+    def record_review_grades(self, cards: List[Dict[str, Any]], grades: List[int]) -> SRState:
+        """Run one SM-2 step over the deck and store the new schedule on each card"""
+        now = datetime.now()
+        state = sm2_step(self._sr_state(cards), grades, now.timestamp())
+        
+        # Every card shares one timestamp string, so _iso_to_timestamp parses it only once
+        last_reviewed = now.isoformat()
+        for card, reps, ef, interval in zip(cards, state.reps.tolist(), state.ef.tolist(),
+                                            state.interval.astype(np.int64).tolist()):
+            card['repetitions'] = reps
+            card['ease_factor'] = ef
+            card['interval'] = interval
+            card['last_reviewed'] = last_reviewed
+            # A stale precomputed timestamp would shadow the new last_reviewed
+            card.pop('_last_reviewed_ts', None)
+        
+        return state
+    
     def _apply_spaced_repetition_order(self, cards: List[Dict[str, Any]], 
                                      profile: PersonalizationProfile) -> List[Dict[str, Any]]:
         """Apply spaced repetition algorithm to card ordering"""
-        # Simple implementation - in production, use proper SM-2 algorithm
-        
-        # Prioritize cards that haven't been seen recently
-        now = datetime.now()
-        
-        for card in cards:
-            last_reviewed = card.get('last_reviewed')
-            if last_reviewed:
-                days_since_review = (now - datetime.fromisoformat(last_reviewed)).days
-                card['priority'] = days_since_review
-            else:
-                card['priority'] = 999  # New cards get high priority
+        # Order by SM-2 due date; cards without a schedule are due at their last review
+        state = self._sr_state(cards)
+        due_ts = state.last_ts + state.interval * 86400
         
-        # Sort by priority (highest first)
-        cards.sort(key=lambda x: x.get('priority', 0), reverse=True)
+        priorities = _review_priorities(datetime.now().timestamp(), due_ts)
+        for card, priority in zip(cards, priorities.tolist()):
+            card['priority'] = priority
         
-        return cards
+        # Most overdue first, keeping deck order among ties
+        order = np.argsort(-priorities, kind='stable')
+        return [cards[i] for i in order]
     
     def _apply_difficulty_progression(self, cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Apply difficulty progression for challenge mode"""
-        # Sort cards by difficulty (easy to hard)
-        difficulty_order = {'easy': 1, 'medium': 2, 'hard': 3}
-        
-        cards.sort(key=lambda x: difficulty_order.get(x.get('difficulty', 'medium'), 2))
+        # Sort cards by difficulty (easy to hard); the key runs once per card
+        rank = _DIFFICULTY_ORDER.get
+        cards.sort(key=lambda card: rank(card.get('difficulty', 'medium'), 2))
         
         return cards
     
@@ -263,7 +397,7 @@ class FlashcardPersonalizer:
                 preferred_styles=[CardStyle.DEFINITION_BASED],
                 difficulty_preference="medium",
                 study_time_preference=30,
-                performance_history=[],
+                performance_history=deque(maxlen=_PERFORMANCE_HISTORY_LIMIT),
                 learning_goals=[],
                 weak_areas=[]
             )
@@ -274,10 +408,16 @@ class FlashcardPersonalizer:
         """Update user profile based on session performance"""
         profile = self.get_user_profile(user_id)
         
-        # Analyze session performance
-        total_cards = len(session_data.get('responses', []))
-        correct_responses = sum(1 for r in session_data.get('responses', []) 
-                              if r.get('correct', False))
+        # Analyze session performance and collect tags of missed cards in one pass
+        responses = session_data.get('responses') or ()
+        total_cards = len(responses)
+        correct_responses = 0
+        weak_area_counts = Counter()
+        for response in responses:
+            if response.get('correct', False):
+                correct_responses += 1
+            else:
+                weak_area_counts.update(response.get('card', {}).get('tags', []))
         accuracy = correct_responses / total_cards if total_cards > 0 else 0
         
         # Update performance history
@@ -290,154 +430,46 @@ class FlashcardPersonalizer:
         }
         profile.performance_history.append(performance_entry)
         
-        # Identify weak areas
-        weak_topics = []
-        for response in session_data.get('responses', []):
-            if not response.get('correct', False):
-                card_tags = response.get('card', {}).get('tags', [])
-                weak_topics.extend(card_tags)
-        
         # Update weak areas (keep most frequent)
-        from collections import Counter
-        weak_area_counts = Counter(weak_topics)
         profile.weak_areas = [topic for topic, count in weak_area_counts.most_common(5)]
         
         # Adjust preferences based on performance
         if accuracy > 0.8:  # High performance
-            if session_data.get('mode') not in profile.preferred_modes:
-                profile.preferred_modes.append(StudyMode(session_data.get('mode')))
-        
-        # Keep only recent performance history (last 30 entries)
-        profile.performance_history = profile.performance_history[-30:]
+            raw_mode = session_data.get('mode')
+            mode = raw_mode if isinstance(raw_mode, StudyMode) else _MODE_BY_VALUE.get(raw_mode)
+            if mode is not None and mode not in profile.preferred_modes:
+                profile.preferred_modes.append(mode)
 
-class UIThemeManager:
-    """Manages different UI themes for different study modes"""
-    
-    def __init__(self):
-        self.themes = {
-            "clean_minimal": {
-                "colors": {
-                    "primary": "#2563eb",
-                    "background": "#ffffff",
-                    "text": "#1f2937",
-                    "accent": "#10b981"
-                },
-                "fonts": {
-                    "primary": "Inter, sans-serif",
-                    "size": "16px"
-                },
-                "layout": {
-                    "card_padding": "2rem",
-                    "border_radius": "12px",
-                    "shadow": "0 4px 6px -1px rgba(0, 0, 0, 0.1)"
-                }
-            },
-            "exam_focused": {
-                "colors": {
-                    "primary": "#dc2626",
-                    "background": "#fef2f2",
-                    "text": "#1f2937",
-                    "accent": "#f59e0b"
-                },
-                "fonts": {
-                    "primary": "system-ui, sans-serif",
-                    "size": "18px"
-                },
-                "layout": {
-                    "card_padding": "1.5rem",
-                    "border_radius": "8px",
-                    "shadow": "0 2px 4px rgba(0, 0, 0, 0.1)"
-                },
-                "features": {
-                    "timer_visible": True,
-                    "progress_bar": True
-                }
-            },
-            "gamified": {
-                "colors": {
-                    "primary": "#7c3aed",
-                    "background": "#faf5ff",
-                    "text": "#1f2937",
-                    "accent": "#06b6d4"
-                },
-                "fonts": {
-                    "primary": "Poppins, sans-serif",
-                    "size": "16px"
-                },
-                "layout": {
-                    "card_padding": "2rem",
-                    "border_radius": "16px",
-                    "shadow": "0 8px 25px -5px rgba(0, 0, 0, 0.1)"
-                },
-                "features": {
-                    "score_display": True,
-                    "streak_counter": True,
-                    "animations": True
-                }
-            },
-            "minimalist": {
-                "colors": {
-                    "primary": "#374151",
-                    "background": "#f9fafb",
-                    "text": "#111827",
-                    "accent": "#6b7280"
-                },
-                "fonts": {
-                    "primary": "system-ui, sans-serif",
-                    "size": "14px"
-                },
-                "layout": {
-                    "card_padding": "1rem",
-                    "border_radius": "4px",
-                    "shadow": "none"
-                },
-                "features": {
-                    "minimal_ui": True,
-                    "auto_advance": True
-                }
-            }
-        }
-    
-    def get_theme_config(self, theme_name: str) -> Dict[str, Any]:
-        """Get theme configuration"""
-        return self.themes.get(theme_name, self.themes["clean_minimal"])
-    
-    def generate_css(self, theme_name: str) -> str:
-        """Generate CSS for a specific theme"""
-        theme = self.get_theme_config(theme_name)
-        
-        css = f"""
+_CSS_TEMPLATE = """
         .flashcard-container {{
-            background-color: {theme['colors']['background']};
-            color: {theme['colors']['text']};
-            font-family: {theme['fonts']['primary']};
-            font-size: {theme['fonts']['size']};
+            background-color: {background};
+            color: {text};
+            font-family: {font};
+            font-size: {font_size};
         }}
         
         .flashcard {{
-            padding: {theme['layout']['card_padding']};
-            border-radius: {theme['layout']['border_radius']};
-            box-shadow: {theme['layout']['shadow']};
+            padding: {card_padding};
+            border-radius: {border_radius};
+            box-shadow: {shadow};
             background-color: white;
         }}
         
         .primary-button {{
-            background-color: {theme['colors']['primary']};
+            background-color: {primary};
             color: white;
             border: none;
             padding: 0.75rem 1.5rem;
-            border-radius: {theme['layout']['border_radius']};
-            font-family: {theme['fonts']['primary']};
+            border-radius: {border_radius};
+            font-family: {font};
         }}
         
         .accent-element {{
-            color: {theme['colors']['accent']};
+            color: {accent};
         }}
         """
-        
-        # Add theme-specific features
-        if theme.get('features', {}).get('timer_visible'):
-            css += """
+
+_TIMER_CSS = """
             .timer-display {
                 position: fixed;
                 top: 1rem;
@@ -448,9 +480,8 @@ class UIThemeManager:
                 border-radius: 4px;
             }
             """
-        
-        if theme.get('features', {}).get('score_display'):
-            css += """
+
+_SCORE_CSS = """
             .score-display {
                 position: fixed;
                 top: 1rem;
@@ -462,5 +493,162 @@ class UIThemeManager:
                 font-weight: bold;
             }
             """
+
+def _clean_minimal_theme() -> Dict[str, Any]:
+    """Configuration for the clean_minimal theme"""
+    return {
+        "colors": {
+            "primary": "#2563eb",
+            "background": "#ffffff",
+            "text": "#1f2937",
+            "accent": "#10b981"
+        },
+        "fonts": {
+            "primary": "Inter, sans-serif",
+            "size": "16px"
+        },
+        "layout": {
+            "card_padding": "2rem",
+            "border_radius": "12px",
+            "shadow": "0 4px 6px -1px rgba(0, 0, 0, 0.1)"
+        }
+    }
+
+def _exam_focused_theme() -> Dict[str, Any]:
+    """Configuration for the exam_focused theme"""
+    return {
+        "colors": {
+            "primary": "#dc2626",
+            "background": "#fef2f2",
+            "text": "#1f2937",
+            "accent": "#f59e0b"
+        },
+        "fonts": {
+            "primary": "system-ui, sans-serif",
+            "size": "18px"
+        },
+        "layout": {
+            "card_padding": "1.5rem",
+            "border_radius": "8px",
+            "shadow": "0 2px 4px rgba(0, 0, 0, 0.1)"
+        },
+        "features": {
+            "timer_visible": True,
+            "progress_bar": True
+        }
+    }
+
+def _gamified_theme() -> Dict[str, Any]:
+    """Configuration for the gamified theme"""
+    return {
+        "colors": {
+            "primary": "#7c3aed",
+            "background": "#faf5ff",
+            "text": "#1f2937",
+            "accent": "#06b6d4"
+        },
+        "fonts": {
+            "primary": "Poppins, sans-serif",
+            "size": "16px"
+        },
+        "layout": {
+            "card_padding": "2rem",
+            "border_radius": "16px",
+            "shadow": "0 8px 25px -5px rgba(0, 0, 0, 0.1)"
+        },
+        "features": {
+            "score_display": True,
+            "streak_counter": True,
+            "animations": True
+        }
+    }
+
+def _minimalist_theme() -> Dict[str, Any]:
+    """Configuration for the minimalist theme"""
+    return {
+        "colors": {
+            "primary": "#374151",
+            "background": "#f9fafb",
+            "text": "#111827",
+            "accent": "#6b7280"
+        },
+        "fonts": {
+            "primary": "system-ui, sans-serif",
+            "size": "14px"
+        },
+        "layout": {
+            "card_padding": "1rem",
+            "border_radius": "4px",
+            "shadow": "none"
+        },
+        "features": {
+            "minimal_ui": True,
+            "auto_advance": True
+        }
+    }
+
+class UIThemeManager:
+    """Manages different UI themes for different study modes"""
+    
+    def __init__(self):
+        # Themes are built and rendered on first use, then cached
+        self._theme_builders = {
+            "clean_minimal": _clean_minimal_theme,
+            "exam_focused": _exam_focused_theme,
+            "gamified": _gamified_theme,
+            "minimalist": _minimalist_theme
+        }
+        self._themes_cache: Dict[str, Dict[str, Any]] = {}
+        self._css_cache: Dict[str, str] = {}
+    
+    @property
+    def themes(self) -> Dict[str, Dict[str, Any]]:
+        """All theme configurations, building any not yet loaded"""
+        return {name: self.get_theme_config(name) for name in self._theme_builders}
+    
+    def get_theme_config(self, theme_name: str) -> Dict[str, Any]:
+        """Get theme configuration"""
+        if theme_name not in self._theme_builders:
+            theme_name = "clean_minimal"
+        
+        theme = self._themes_cache.get(theme_name)
+        if theme is None:
+            theme = self._themes_cache[theme_name] = self._theme_builders[theme_name]()
+        return theme
+    
+    def generate_css(self, theme_name: str) -> str:
+        """Generate CSS for a specific theme"""
+        if theme_name not in self._theme_builders:
+            theme_name = "clean_minimal"
+        
+        css = self._css_cache.get(theme_name)
+        if css is None:
+            css = self._css_cache[theme_name] = self._render_css(theme_name)
+        return css
+    
+    def _render_css(self, theme_name: str) -> str:
+        """Render the CSS for a theme"""
+        theme = self.get_theme_config(theme_name)
+        colors, fonts, layout = theme['colors'], theme['fonts'], theme['layout']
+        
+        parts = [_CSS_TEMPLATE.format(
+            background=colors['background'],
+            text=colors['text'],
+            primary=colors['primary'],
+            accent=colors['accent'],
+            font=fonts['primary'],
+            font_size=fonts['size'],
+            card_padding=layout['card_padding'],
+            border_radius=layout['border_radius'],
+            shadow=layout['shadow']
+        )]
+        
+        # Add theme-specific features
+        features = theme.get('features', {})
+        if features.get('timer_visible'):
+            parts.append(_TIMER_CSS)
+        
+        if features.get('score_display'):
+            parts.append(_SCORE_CSS)
         
-        return css
\ No newline at end of file
+        return ''.join(parts)
\ No newline at end of file
@@ -5,16 +5,75 @@ Provides intelligent suggestions based on content analysis and user preferences
 
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import KMeans
 from sentence_transformers import SentenceTransformer
 import json
+import os
+import re
 import sqlite3
+import threading
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 import logging
 
+try:
+    import simsimd  # Optional SIMD cosine kernels; NumPy is used when it is missing
+except ImportError:
+    simsimd = None
+
+# SimSIMD scores half-precision embeddings natively, halving the bytes read per query
+_EMBEDDING_DTYPE = np.float16 if simsimd is not None else np.float32
+
+_SBERT_MODEL = 'all-MiniLM-L6-v2'
+
+def _detect_device() -> str:
+    """Pick CUDA, then Apple MPS, then CPU; BUNYAN_SBERT_DEVICE overrides the probe"""
+    override = os.environ.get('BUNYAN_SBERT_DEVICE')
+    if override:
+        return override
+    
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return 'cuda'
+        if torch.backends.mps.is_available():
+            return 'mps'
+    except (ImportError, AttributeError):
+        pass
+    return 'cpu'
+
+@lru_cache(maxsize=4)
+def _get_sbert(name: str) -> SentenceTransformer:
+    """Load a sentence-embedding model once per process and share it"""
+    return SentenceTransformer(name, device=_detect_device())
+
+def _normalized(vector: np.ndarray) -> np.ndarray:
+    """Scale a vector to unit length so cosine similarity is a plain dot product"""
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _cosine_scores(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine similarity of a unit-normalized query against every row of a unit-normalized matrix"""
+    if simsimd is not None and len(matrix):
+        distances = simsimd.cdist(query.astype(matrix.dtype)[np.newaxis, :], matrix, metric='cosine')
+        return 1.0 - np.asarray(distances, dtype=np.float32).ravel()
+    return matrix @ query.astype(matrix.dtype)
+
+# Content cues behind the suggested modifications, found in one scan; the
+# lookahead matches at every position, so cues inside other words still count
+_MODIFICATION_CUES = re.compile(
+    r'(?=(?P<definition>definition)'
+    r'|(?P<process>process|step|procedure)'
+    r'|(?P<compare>compare|contrast|difference)'
+    r'|(?P<basic>basic))'
+)
+
+def _modification_cues(content: str) -> frozenset:
+    """Names of the modification cues present in the content"""
+    return frozenset(match.lastgroup for match in _MODIFICATION_CUES.finditer(content.lower()))
+
 class DifficultyLevel(Enum):
     BEGINNER = "beginner"
     INTERMEDIATE = "intermediate"
@@ -42,6 +101,14 @@ class FlashcardTemplate:
     rating: float
     embedding: Optional[np.ndarray] = None
 
+def _template_matrix(templates: List[FlashcardTemplate], dim: int) -> np.ndarray:
+    """Stack template embeddings into an (N, dim) matrix; missing embeddings score 0.0"""
+    matrix = np.zeros((len(templates), dim), dtype=_EMBEDDING_DTYPE)
+    for i, template in enumerate(templates):
+        if template.embedding is not None:
+            matrix[i] = template.embedding
+    return matrix
+
 @dataclass
 class RecommendationResult:
     template: FlashcardTemplate
@@ -54,13 +121,17 @@ class KnowledgeBaseManager:
     
     def __init__(self, db_path: str = "knowledge_base.db"):
         self.db_path = db_path
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.sentence_model = _get_sbert(_SBERT_MODEL)
+        # One long-lived connection; the lock serializes it across threads
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
         self._initialize_database()
         self._load_predefined_templates()
+        self.reload()
     
     def _initialize_database(self):
         """Initialize the knowledge base database"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -89,7 +160,6 @@ class KnowledgeBaseManager:
         ''')
         
         conn.commit()
-        conn.close()
     
     def _load_predefined_templates(self):
         """Load predefined flashcard templates for various fields"""
@@ -166,18 +236,24 @@ class KnowledgeBaseManager:
             }
         ]
         
-        conn = sqlite3.connect(self.db_path)
+        # Generate all embeddings in one batched, unit-normalized pass
+        embeddings = self.sentence_model.encode(
+            [template["content"] for template in templates],
+            batch_size=32,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32)
+        
+        conn = self._conn
         cursor = conn.cursor()
         
-        for template in templates:
-            # Generate embedding
-            embedding = self.sentence_model.encode(template["content"])
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO flashcard_templates 
-                (id, title, content, field, difficulty, learning_objective, tags, embedding)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        cursor.executemany('''
+            INSERT OR REPLACE INTO flashcard_templates 
+            (id, title, content, field, difficulty, learning_objective, tags, embedding)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
                 template["id"],
                 template["title"],
                 template["content"],
@@ -186,19 +262,73 @@ class KnowledgeBaseManager:
                 template["learning_objective"],
                 json.dumps(template["tags"]),
                 embedding.tobytes()
-            ))
+            )
+            for template, embedding in zip(templates, embeddings)
+        ])
         
         conn.commit()
-        conn.close()
+    
+    def reload(self):
+        """Reload all templates from the database and drop the per-field caches"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+                SELECT id, title, content, field, difficulty, learning_objective, tags, usage_count, rating, embedding
+                FROM flashcard_templates 
+                ORDER BY rating DESC, usage_count DESC
+            ''')
+            rows = cursor.fetchall()
+        
+        templates = []
+        for row in rows:
+            embedding = _normalized(np.frombuffer(row[9], dtype=np.float32)) if row[9] else None
+            template = FlashcardTemplate(
+                id=row[0],
+                title=row[1],
+                content=row[2],
+                field=row[3],
+                difficulty=DifficultyLevel(row[4]),
+                learning_objective=LearningObjective(row[5]),
+                tags=json.loads(row[6]),
+                usage_count=row[7],
+                rating=row[8],
+                embedding=embedding
+            )
+            templates.append(template)
+        
+        self._templates = templates
+        self._templates_by_field: Dict[str, Tuple[List[FlashcardTemplate], np.ndarray]] = {}
+    
+    def get_templates_by_field(self, field: str) -> Tuple[List[FlashcardTemplate], np.ndarray]:
+        """Templates for a field plus general ones, with their normalized embedding matrix"""
+        cached = self._templates_by_field.get(field)
+        if cached is None:
+            templates = [template for template in self._templates
+                         if template.field == field or template.field == 'general']
+            cached = (templates, _template_matrix(templates, self.sentence_model.get_sentence_embedding_dimension()))
+            self._templates_by_field[field] = cached
+        return cached
+    
+    def close(self):
+        """Close the shared database connection"""
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 class SmartRecommendationEngine:
     """Advanced recommendation engine for flashcard suggestions"""
     
     def __init__(self, knowledge_base: KnowledgeBaseManager):
         self.knowledge_base = knowledge_base
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.sentence_model = knowledge_base.sentence_model
         self.tfidf_vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
         self.field_classifier = self._train_field_classifier()
+        self._keyword_fields, self._keyword_pattern = self._compile_field_keywords(self.field_classifier)
     
     def _train_field_classifier(self):
         """Train a classifier to detect academic fields"""
@@ -214,19 +344,32 @@ class SmartRecommendationEngine:
         }
         return field_keywords
     
+    def _compile_field_keywords(self, field_keywords: Dict[str, List[str]]) -> Tuple[Dict[str, List[str]], re.Pattern]:
+        """Map each keyword to its fields and build one pattern that finds them all in a single scan"""
+        keyword_fields = {}
+        for field, keywords in field_keywords.items():
+            for keyword in keywords:
+                keyword_fields.setdefault(keyword, []).append(field)
+        
+        # A lookahead matches at every position, so keywords inside or overlapping
+        # other words are found just like plain substring checks
+        alternation = '|'.join(map(re.escape, sorted(keyword_fields, key=len, reverse=True)))
+        return keyword_fields, re.compile(f'(?=({alternation}))')
+    
     def detect_field(self, content: str) -> str:
         """Detect the academic field of the content"""
-        content_lower = content.lower()
-        field_scores = {}
-        
-        for field, keywords in self.field_classifier.items():
-            score = sum(1 for keyword in keywords if keyword in content_lower)
-            field_scores[field] = score
-        
-        # Return field with highest score, default to 'general'
-        if max(field_scores.values()) > 0:
-            return max(field_scores, key=field_scores.get)
-        return "general"
+        found = set(self._keyword_pattern.findall(content.lower()))
+        if not found:
+            return "general"
+        
+        # Each distinct keyword present scores one point for every field listing it
+        field_scores = dict.fromkeys(self.field_classifier, 0)
+        for keyword in found:
+            for field in self._keyword_fields[keyword]:
+                field_scores[field] += 1
+        
+        # Return field with highest score
+        return max(field_scores, key=field_scores.get)
     
     def get_recommendations(self, 
                           lecture_content: str, 
@@ -237,76 +380,47 @@ class SmartRecommendationEngine:
         # Detect field
         detected_field = self.detect_field(lecture_content)
         
-        # Generate content embedding
-        content_embedding = self.sentence_model.encode(lecture_content)
+        # Generate content embedding, unit-normalized once for every template comparison
+        content_embedding = self.sentence_model.encode(lecture_content, normalize_embeddings=True)
         
         # Get templates from knowledge base
-        templates = self._get_templates_by_field(detected_field)
-        
-        # Calculate similarities and rank
+        templates, matrix = self._get_templates_by_field(detected_field)
+        
+        # Apply user preference filters
+        keep = [i for i, template in enumerate(templates)
+                if self._matches_user_preferences(template, user_preferences)]
+        candidates = templates
+        if len(keep) < len(templates):
+            candidates = [templates[i] for i in keep]
+            matrix = matrix[keep]
+        
+        # Score every candidate in one pass over the embedding matrix
+        similarities = _cosine_scores(matrix, content_embedding)
+        
+        # Keep the top recommendations by similarity, ties in knowledge-base order
+        k = min(max_recommendations, len(candidates))
+        if k <= 0:
+            return []
+        top = np.sort(np.argpartition(-similarities, k - 1)[:k]) if k < len(candidates) else np.arange(k)
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        
+        cues = _modification_cues(lecture_content)
         recommendations = []
-        for template in templates:
-            similarity = self._calculate_similarity(content_embedding, template.embedding)
-            
-            # Apply user preference filters
-            if self._matches_user_preferences(template, user_preferences):
-                relevance_reason = self._generate_relevance_reason(template, detected_field, similarity)
-                modifications = self._suggest_modifications(template, lecture_content)
-                
-                recommendations.append(RecommendationResult(
-                    template=template,
-                    similarity_score=similarity,
-                    relevance_reason=relevance_reason,
-                    suggested_modifications=modifications
-                ))
-        
-        # Sort by similarity and return top recommendations
-        recommendations.sort(key=lambda x: x.similarity_score, reverse=True)
-        return recommendations[:max_recommendations]
-    
-    def _get_templates_by_field(self, field: str) -> List[FlashcardTemplate]:
-        """Retrieve templates from the knowledge base by field"""
-        conn = sqlite3.connect(self.knowledge_base.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, title, content, field, difficulty, learning_objective, tags, usage_count, rating, embedding
-            FROM flashcard_templates 
-            WHERE field = ? OR field = 'general'
-            ORDER BY rating DESC, usage_count DESC
-        ''', (field,))
-        
-        templates = []
-        for row in cursor.fetchall():
-            embedding = np.frombuffer(row[9], dtype=np.float32) if row[9] else None
-            template = FlashcardTemplate(
-                id=row[0],
-                title=row[1],
-                content=row[2],
-                field=row[3],
-                difficulty=DifficultyLevel(row[4]),
-                learning_objective=LearningObjective(row[5]),
-                tags=json.loads(row[6]),
-                usage_count=row[7],
-                rating=row[8],
-                embedding=embedding
-            )
-            templates.append(template)
+        for i in top.tolist():
+            template = candidates[i]
+            similarity = float(similarities[i])
+            recommendations.append(RecommendationResult(
+                template=template,
+                similarity_score=similarity,
+                relevance_reason=self._generate_relevance_reason(template, detected_field, similarity),
+                suggested_modifications=self._suggest_modifications(template, cues)
+            ))
         
-        conn.close()
-        return templates
+        return recommendations
     
-    def _calculate_similarity(self, content_embedding: np.ndarray, template_embedding: np.ndarray) -> float:
-        """Calculate semantic similarity between content and template"""
-        if template_embedding is None:
-            return 0.0
-        
-        # Reshape for cosine similarity calculation
-        content_embedding = content_embedding.reshape(1, -1)
-        template_embedding = template_embedding.reshape(1, -1)
-        
-        similarity = cosine_similarity(content_embedding, template_embedding)[0][0]
-        return float(similarity)
+    def _get_templates_by_field(self, field: str) -> Tuple[List[FlashcardTemplate], np.ndarray]:
+        """Retrieve templates from the knowledge base by field"""
+        return self.knowledge_base.get_templates_by_field(field)
     
     def _matches_user_preferences(self, template: FlashcardTemplate, preferences: Dict[str, Any]) -> bool:
         """Check if template matches user preferences"""
@@ -350,21 +464,21 @@ class SmartRecommendationEngine:
         
         return "; ".join(reasons) if reasons else "General template match"
     
-    def _suggest_modifications(self, template: FlashcardTemplate, content: str) -> List[str]:
+    def _suggest_modifications(self, template: FlashcardTemplate, cues: frozenset) -> List[str]:
         """Suggest modifications to adapt template to specific content"""
         modifications = []
         
         # Analyze content for specific entities
-        if "definition" in content.lower():
+        if 'definition' in cues:
             modifications.append("Add definition-based questions")
         
-        if any(word in content.lower() for word in ["process", "step", "procedure"]):
+        if 'process' in cues:
             modifications.append("Convert to process-based cloze deletions")
         
-        if any(word in content.lower() for word in ["compare", "contrast", "difference"]):
+        if 'compare' in cues:
             modifications.append("Create comparison-style questions")
         
-        if template.difficulty == DifficultyLevel.ADVANCED and "basic" in content.lower():
+        if template.difficulty == DifficultyLevel.ADVANCED and 'basic' in cues:
             modifications.append("Simplify language for better understanding")
         
         return modifications
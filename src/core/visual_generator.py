@@ -3,31 +3,89 @@ Visual Flashcard Generator Module
 Converts structured content into visual learning materials
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.patches import FancyBboxPatch
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import networkx as nx
-import graphviz
-import seaborn as sns
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import base64
+import html
 import io
+import re
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 import json
 
+# matplotlib, networkx and plotly are imported on first render; they dominate import time
+
+_RENDER_CACHE_SIZE = 256
+
+def _indicator_pattern(indicators: List[str]) -> re.Pattern:
+    """One case-insensitive pattern that finds any of the indicators anywhere in the text"""
+    return re.compile('|'.join(map(re.escape, indicators)), re.IGNORECASE)
+
+def _new_axes(figsize: Tuple[float, float]):
+    """A standalone figure and axes; unlike pyplot this keeps no global state, so it is thread-safe"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots()
+
+def _svg_data_uri(svg: bytes) -> str:
+    """Encode SVG markup as a base64 data: URI, so the payload carries its own MIME type"""
+    return 'data:image/svg+xml;base64,' + base64.b64encode(svg).decode()
+
+def _figure_base64(fig) -> str:
+    """Lay out the figure and encode it as an SVG data URI; vector output skips rasterizing entirely"""
+    fig.tight_layout()
+    img_buffer = io.BytesIO()
+    fig.savefig(img_buffer, format='svg', bbox_inches='tight', metadata={'Date': None})
+    return _svg_data_uri(img_buffer.getvalue())
+
+def _table_svg(df: pd.DataFrame, title: str, header_color: str) -> bytes:
+    """Draw a table as plain SVG markup: a colored header row, then alternately shaded rows"""
+    col_width, row_height, title_height = 160, 32, 48
+    width = col_width * len(df.columns)
+    rows = [list(df.columns)] + df.values.tolist()
+    
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{title_height + row_height * len(rows)}" '
+        f'font-family="sans-serif" font-size="11">',
+        f'<text x="{width / 2}" y="{title_height / 2}" text-anchor="middle" dominant-baseline="middle" '
+        f'font-size="16" font-weight="bold">{html.escape(title)}</text>'
+    ]
+    for i, row in enumerate(rows):
+        y = title_height + i * row_height
+        fill = header_color if i == 0 else ('#f1f5f9' if i % 2 == 0 else 'white')
+        text_style = ' fill="white" font-weight="bold"' if i == 0 else ''
+        parts.append(f'<rect x="0" y="{y}" width="{width}" height="{row_height}" fill="{fill}"/>')
+        for j, cell in enumerate(row):
+            parts.append(f'<text x="{(j + 0.5) * col_width}" y="{y + row_height / 2}" text-anchor="middle" '
+                         f'dominant-baseline="middle"{text_style}>{html.escape(str(cell))}</text>')
+    parts.append('</svg>')
+    return ''.join(parts).encode()
+
+_TABLE_CSS = """<style>
+.cmp-table-card {{ margin: 0; font-size: 11px; }}
+.cmp-table-card figcaption {{ font-size: 16px; font-weight: bold; text-align: center; padding-bottom: 20px; }}
+.cmp-table {{ border-collapse: collapse; margin: 0 auto; }}
+.cmp-table th, .cmp-table td {{ text-align: center; padding: 0.5em 1.5em; }}
+.cmp-table th {{ background-color: {primary}; color: white; font-weight: bold; }}
+.cmp-table tbody tr:nth-child(even) {{ background-color: #f1f5f9; }}
+.cmp-table tbody tr:nth-child(odd) {{ background-color: white; }}
+</style>"""
+
+_STEP_INDICATORS = _indicator_pattern(['step', 'first', 'second', 'then', 'next', 'finally', 'process'])
+_COMPARISON_INDICATORS = _indicator_pattern(['vs', 'versus', 'compared to', 'difference', 'similarity'])
+_HIERARCHY_INDICATORS = _indicator_pattern(['category', 'type', 'classification', 'branch', 'subtopic'])
+
 @dataclass
 class VisualCard:
     """Data structure for visual flashcard content"""
     title: str
     content_type: str  # 'diagram', 'table', 'mindmap', 'chart'
     data: Dict[str, Any]
-    image_base64: str
+    image_base64: str  # data:image/svg+xml;base64 URI
     metadata: Dict[str, Any]
+    html_content: Optional[str] = None  # Styled HTML alternative, set for tables
 
 class VisualFlashcardGenerator:
     """Advanced visual content generator for educational materials"""
@@ -49,10 +107,46 @@ class VisualFlashcardGenerator:
                 'caption': {'size': 10, 'weight': 'normal'}
             }
         }
+        # Rendered (image, metadata) by content type, data and title, least recently used first
+        self._render_cache: OrderedDict = OrderedDict()
+        self._render_lock = threading.Lock()
+    
+    def _cached_render(self, content_type: str, data: Any, title: str,
+                       render: Callable[[], Tuple[Any, Dict[str, Any]]]) -> Tuple[Any, Dict[str, Any]]:
+        """Return the cached render for identical input, rendering it on a miss"""
+        key = (content_type, json.dumps(data, default=str), title)
+        with self._render_lock:
+            cached = self._render_cache.get(key)
+            if cached is not None:
+                self._render_cache.move_to_end(key)
+                return cached[0], dict(cached[1])
+        
+        # Render outside the lock so independent cards can render concurrently
+        cached = render()
+        with self._render_lock:
+            self._render_cache[key] = cached
+            if len(self._render_cache) > _RENDER_CACHE_SIZE:
+                self._render_cache.popitem(last=False)
+        return cached[0], dict(cached[1])
     
     def generate_process_diagram(self, steps: List[str], title: str = "Process Flow") -> VisualCard:
         """Generate a process flow diagram"""
-        fig, ax = plt.subplots(figsize=(12, 8))
+        img_base64, metadata = self._cached_render(
+            'diagram', steps, title, lambda: self._render_process_diagram(steps, title))
+        
+        return VisualCard(
+            title=title,
+            content_type='diagram',
+            data={'steps': steps},
+            image_base64=img_base64,
+            metadata=metadata
+        )
+    
+    def _render_process_diagram(self, steps: List[str], title: str) -> Tuple[str, Dict[str, Any]]:
+        """Draw the process flow diagram"""
+        from matplotlib.patches import FancyBboxPatch
+        
+        fig, ax = _new_axes((12, 8))
         ax.set_xlim(0, 10)
         ax.set_ylim(0, len(steps) + 1)
         
@@ -84,72 +178,58 @@ class VisualFlashcardGenerator:
         
         ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
         ax.axis('off')
-        plt.tight_layout()
         
-        # Convert to base64
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-        plt.close()
-        
-        return VisualCard(
-            title=title,
-            content_type='diagram',
-            data={'steps': steps},
-            image_base64=img_base64,
-            metadata={'step_count': len(steps), 'diagram_type': 'process'}
-        )
+        return _figure_base64(fig), {'step_count': len(steps), 'diagram_type': 'process', 'format': 'svg'}
     
     def generate_comparison_table(self, data: Dict[str, List[str]], title: str = "Comparison") -> VisualCard:
         """Generate a visual comparison table"""
-        df = pd.DataFrame(data)
-        
-        fig, ax = plt.subplots(figsize=(12, 8))
-        
-        # Create table
-        table = ax.table(cellText=df.values, colLabels=df.columns,
-                        cellLoc='center', loc='center',
-                        colWidths=[0.3] * len(df.columns))
-        
-        # Style the table
-        table.auto_set_font_size(False)
-        table.set_fontsize(11)
-        table.scale(1, 2)
-        
-        # Header styling
-        for i in range(len(df.columns)):
-            table[(0, i)].set_facecolor(self.style_config['colors']['primary'])
-            table[(0, i)].set_text_props(weight='bold', color='white')
-        
-        # Alternate row colors
-        for i in range(1, len(df) + 1):
-            for j in range(len(df.columns)):
-                if i % 2 == 0:
-                    table[(i, j)].set_facecolor('#f1f5f9')
-                else:
-                    table[(i, j)].set_facecolor('white')
-        
-        ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
-        ax.axis('off')
-        plt.tight_layout()
-        
-        # Convert to base64
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-        plt.close()
+        (img_base64, table_html), metadata = self._cached_render(
+            'table', data, title, lambda: self._render_comparison_table(data, title))
         
         return VisualCard(
             title=title,
             content_type='table',
             data=data,
             image_base64=img_base64,
-            metadata={'rows': len(df), 'columns': len(df.columns)}
+            metadata=metadata,
+            html_content=table_html
         )
     
+    def _render_comparison_table(self, data: Dict[str, List[str]],
+                                 title: str) -> Tuple[Tuple[str, str], Dict[str, Any]]:
+        """Render the comparison table as SVG and styled HTML; no figure is drawn"""
+        df = pd.DataFrame(data)
+        primary = self.style_config['colors']['primary']
+        
+        table_html = (
+            _TABLE_CSS.format(primary=primary)
+            + f'<figure class="cmp-table-card"><figcaption>{html.escape(title)}</figcaption>'
+            + df.to_html(classes='cmp-table', index=False, border=0)
+            + '</figure>'
+        )
+        image = _svg_data_uri(_table_svg(df, title, primary))
+        return (image, table_html), {'rows': len(df), 'columns': len(df.columns), 'format': 'svg'}
+    
     def generate_mindmap(self, central_topic: str, branches: Dict[str, List[str]], 
                         title: str = "Concept Map") -> VisualCard:
         """Generate an interactive mindmap"""
+        img_base64, metadata = self._cached_render(
+            'mindmap', [central_topic, branches], title,
+            lambda: self._render_mindmap(central_topic, branches, title))
+        
+        return VisualCard(
+            title=title,
+            content_type='mindmap',
+            data={'central_topic': central_topic, 'branches': branches},
+            image_base64=img_base64,
+            metadata=metadata
+        )
+    
+    def _render_mindmap(self, central_topic: str, branches: Dict[str, List[str]],
+                        title: str) -> Tuple[str, Dict[str, Any]]:
+        """Lay out and draw the mindmap graph"""
+        import networkx as nx
+        
         G = nx.Graph()
         
         # Add central node
@@ -167,7 +247,7 @@ class VisualFlashcardGenerator:
         # Create layout
         pos = nx.spring_layout(G, k=3, iterations=50)
         
-        fig, ax = plt.subplots(figsize=(14, 10))
+        fig, ax = _new_axes((14, 10))
         
         # Draw nodes with different colors based on type
         node_colors = []
@@ -194,24 +274,13 @@ class VisualFlashcardGenerator:
         
         ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
         ax.axis('off')
-        plt.tight_layout()
-        
-        # Convert to base64
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-        plt.close()
         
-        return VisualCard(
-            title=title,
-            content_type='mindmap',
-            data={'central_topic': central_topic, 'branches': branches},
-            image_base64=img_base64,
-            metadata={'total_nodes': len(G.nodes()), 'total_edges': len(G.edges())}
-        )
+        return _figure_base64(fig), {'total_nodes': len(G.nodes()), 'total_edges': len(G.edges()), 'format': 'svg'}
     
     def generate_interactive_chart(self, data: Dict[str, Any], chart_type: str = 'bar') -> str:
         """Generate interactive Plotly charts"""
+        import plotly.express as px
+        
         if chart_type == 'bar':
             fig = px.bar(
                 x=list(data.keys()), 
@@ -270,8 +339,7 @@ class ContentAnalyzer:
     
     def _contains_process_steps(self, content: str) -> bool:
         """Check if content contains process steps"""
-        step_indicators = ['step', 'first', 'second', 'then', 'next', 'finally', 'process']
-        return any(indicator in content.lower() for indicator in step_indicators)
+        return _STEP_INDICATORS.search(content) is not None
     
     def _extract_process_steps(self, content: str) -> List[str]:
         """Extract process steps from content"""
@@ -287,8 +355,7 @@ class ContentAnalyzer:
     
     def _contains_comparison_data(self, content: str) -> bool:
         """Check if content contains comparison data"""
-        comparison_indicators = ['vs', 'versus', 'compared to', 'difference', 'similarity']
-        return any(indicator in content.lower() for indicator in comparison_indicators)
+        return _COMPARISON_INDICATORS.search(content) is not None
     
     def _extract_comparison_data(self, content: str) -> Dict[str, List[str]]:
         """Extract comparison data from content"""
@@ -301,8 +368,7 @@ class ContentAnalyzer:
     
     def _contains_hierarchical_info(self, content: str) -> bool:
         """Check if content contains hierarchical information"""
-        hierarchy_indicators = ['category', 'type', 'classification', 'branch', 'subtopic']
-        return any(indicator in content.lower() for indicator in hierarchy_indicators)
+        return _HIERARCHY_INDICATORS.search(content) is not None
     
     def _extract_hierarchical_info(self, content: str) -> tuple:
         """Extract hierarchical information from content"""
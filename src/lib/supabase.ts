@@ -82,8 +82,8 @@ export interface VisualContent {
   content_type: 'diagram' | 'table' | 'mindmap' | 'chart'
   title: string
   data: any
-  image_base64?: string
-  html_content?: string
+  image_base64?: string // data: URI, usable directly as an <img> src (SVG for generated visuals)
+  html_content?: string // Styled HTML rendering, set for comparison tables
   metadata: any
   created_at: string
 }
@@ -0,0 +1,68 @@
+"""
+Tests for the AI flashcard editor's session lifecycle
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src' / 'core'))
+
+from ai_editor import AIFlashcardEditor
+
+TEXT = "The mitochondria is the organelle that produces most of the cell's energy"
+
+class _StubGemini:
+    def __init__(self, calls):
+        self.calls = calls
+    
+    async def generate_content_async(self, prompt):
+        self.calls.append('gemini')
+        raise RuntimeError("stubbed")
+
+@pytest.fixture
+def editor(monkeypatch):
+    """Editor built outside the event loop (so no prewarm), with every model call recorded"""
+    editor = AIFlashcardEditor(openai_api_key="test", gemini_api_key="test")
+    editor.model_calls = []
+
+    async def fake_openai(prompt, *args, **kwargs):
+        editor.model_calls.append('openai')
+        return ""
+
+    async def fake_combined(text, needs):
+        editor.model_calls.append('openai')
+        return []
+
+    monkeypatch.setattr(editor, '_call_openai_async', fake_openai)
+    monkeypatch.setattr(editor, '_call_openai_first_line', fake_openai)
+    monkeypatch.setattr(editor, '_generate_combined_suggestions', fake_combined)
+    editor.gemini_model = _StubGemini(editor.model_calls)
+    return editor
+
+def _start_session(editor):
+    session_id = editor.start_edit_session('user', {'id': 'card', 'front': '', 'back': ''})
+    editor.active_sessions[session_id]._debounce_delay = 0.01
+    return session_id
+
+@pytest.mark.asyncio
+async def test_debounced_suggestion_calls_model(editor):
+    session_id = _start_session(editor)
+
+    await editor.get_real_time_suggestions(session_id, 'front', TEXT)
+
+    assert editor.model_calls
+
+@pytest.mark.asyncio
+async def test_end_session_cancels_pending_debounce(editor):
+    session_id = _start_session(editor)
+
+    pending = asyncio.create_task(editor.get_real_time_suggestions(session_id, 'front', TEXT))
+    await asyncio.sleep(0)  # Let the debounced task get scheduled
+    editor.end_session(session_id)
+
+    assert await pending == []
+    await asyncio.sleep(0.05)
+    assert editor.model_calls == []
\ No newline at end of file